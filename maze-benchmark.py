@@ -0,0 +1,391 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4 sw=4 et
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import random
+import sys
+import textwrap
+import timeit
+from PIL import Image
+
+import maze_solver
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+
+VERSION = 1
+
+# Stages of the pipeline of maze-solver.py, in order.
+STAGES = [
+    'decode', 'threshold', 'crop', 'walls', 'cells', 'solve', 'cycles',
+    'render',
+]
+
+# Stages faster than this are too noisy to be reported as regressions.
+MINIMUM_TIME = 0.001
+
+
+def load_module(name, filename):
+    '''Imports a Python file that is not a valid module name, such as
+    maze-generator.py.'''
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    try:
+        import importlib.util
+    except ImportError:
+        # Python 2
+        import imp
+        return imp.load_source(name, path)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+maze_generator = load_module('maze_generator', 'maze-generator.py')
+
+
+def comma_separated(type):
+    '''Returns an argparse type for comma-separated lists of values.'''
+
+    def parse(text):
+        return [type(value) for value in text.split(',') if value]
+    return parse
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description=textwrap.dedent('''
+        Benchmarks each stage of maze-solver.py, for mazes of several sizes
+        and with several solvers.
+
+        The mazes are generated in memory by maze-generator.py, and the
+        timings (the best of a few repetitions) and peak memory of each
+        stage are written as JSON. These results can be compared with a
+        previous run, which makes the exit status non-zero if any stage got
+        slower than the tolerance allows.
+
+        Stages:
+          decode     Image.open() and conversion to RGB
+          threshold  preprocess_image()
+          crop       find_white_border() and cropping
+          walls      find_walls()
+          cells      sample_cells(), building the MazeGrid
+          solve      the solver
+          cycles     count_cycles()
+          render     print_maze(), into memory
+        '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--sizes',
+        action='store',
+        type=comma_separated(int),
+        default=[100, 300, 1000],
+        metavar='N,N,...',
+        help='''
+        comma-separated sizes of the square mazes, in cells (default:
+        100,300,1000)
+        '''
+    )
+    parser.add_argument(
+        '--solvers',
+        action='store',
+        type=comma_separated(str),
+        default=sorted(set(maze_solver.SOLVERS) - set(['reference'])),
+        metavar='NAME,NAME,...',
+        help='''
+        comma-separated solvers to benchmark; the reference solver is left out
+        by default, as it is too slow for large mazes (default: all the
+        others)
+        '''
+    )
+    parser.add_argument(
+        '-r', '--repeat',
+        action='store',
+        type=int,
+        default=3,
+        help='''
+        how many times each maze is solved; the best time of each stage is
+        kept (default: %(default)s)
+        '''
+    )
+    parser.add_argument(
+        '-l', '--loops',
+        action='store',
+        type=float,
+        default=0.05,
+        metavar='FRACTION',
+        help='''
+        fraction of inner walls removed from the generated mazes (default:
+        %(default)s)
+        '''
+    )
+    parser.add_argument(
+        '-s', '--seed',
+        action='store',
+        type=int,
+        default=0,
+        help='seed used for generating the mazes (default: %(default)s)'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        action='store',
+        metavar='FILE',
+        help='write the results as JSON to this file'
+    )
+    parser.add_argument(
+        '--baseline',
+        action='store',
+        type=argparse.FileType('r'),
+        metavar='FILE',
+        help='compare the results with this previous output'
+    )
+    parser.add_argument(
+        '--tolerance',
+        action='store',
+        type=float,
+        default=0.25,
+        metavar='FRACTION',
+        help='''
+        how much slower than the baseline a stage may be before it counts as
+        a regression (default: %(default)s, i.e. 25%% slower)
+        '''
+    )
+
+    args = parser.parse_args()
+    if not args.sizes or min(args.sizes) < 1:
+        parser.error('--sizes must be positive numbers')
+    for name in args.solvers:
+        if name not in maze_solver.SOLVERS:
+            parser.error('unknown solver: {0}'.format(name))
+    if args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+    if args.tolerance < 0:
+        parser.error('--tolerance must not be negative')
+    return args
+
+
+def generate_picture(size, loops, seed):
+    '''Returns the PNG data of a random maze of size x size cells.'''
+
+    rng = random.Random(seed)
+    vertical, horizontal = maze_generator.build_backtracker(size, size, rng)
+    if loops:
+        maze_generator.add_loops(vertical, horizontal, loops, rng)
+    data = io.BytesIO()
+    maze_generator.draw_maze(vertical, horizontal, 5, 10).save(data, 'PNG')
+    return data.getvalue()
+
+
+class StageTimer(object):
+    '''Runs the stages of a benchmark, keeping their time and peak memory.
+
+    Each stage is a call to run(). When tracing, tracemalloc is restarted for
+    each stage, so the peaks only count the memory allocated by that stage
+    (numpy reports its arrays to tracemalloc too). As tracing slows down
+    everything, traced runs are not timed.
+    '''
+
+    def __init__(self):
+        self.times = {}
+        self.peaks = {}
+        self.tracing = False
+
+    def run(self, stage, function, *args):
+        gc.collect()
+        if self.tracing:
+            tracemalloc.start()
+            try:
+                return function(*args)
+            finally:
+                self.peaks[stage] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+        start = timeit.default_timer()
+        try:
+            return function(*args)
+        finally:
+            elapsed = timeit.default_timer() - start
+            self.times[stage] = min(self.times.get(stage, elapsed), elapsed)
+
+
+def decode(data):
+    '''Decodes the picture data as an RGB image.'''
+
+    return Image.open(io.BytesIO(data)).convert('RGB')
+
+
+def crop(pixels):
+    '''The auto-cropping step of maze_solver.load_pixels().'''
+
+    height, width = pixels.shape
+    top, bottom, left, right = maze_solver.find_white_border(pixels)
+    return pixels[top:height - bottom, left:width - right]
+
+
+def build_grid(pixels, wall_rows, wall_cols):
+    '''The last step of maze_solver.build_maze_grid_from_image().'''
+
+    return maze_solver.MazeGrid(
+        maze_solver.sample_cells(pixels, wall_rows, wall_cols))
+
+
+def run_pipeline(timer, data, solver_name, size):
+    '''Runs the whole pipeline on the picture data of a size x size maze, as
+    maze-solver.py does.
+    '''
+
+    img = timer.run('decode', decode, data)
+    pixels = timer.run('threshold', maze_solver.preprocess_image, img)
+    del img
+    pixels = timer.run('crop', crop, pixels)
+    wall_rows, wall_cols = timer.run(
+        'walls', maze_solver.find_walls, pixels)
+    maze = timer.run('cells', build_grid, pixels, wall_rows, wall_cols)
+    del pixels
+    # Otherwise, the walls were misdetected, and the timings are meaningless.
+    assert maze.cells.shape == (size, size), (
+        'the {0}x{0} maze was parsed as {1}x{2}'.format(
+            size, maze.width, maze.height))
+    unsolved_maze = maze.copy()
+    timer.run('solve', maze_solver.SOLVERS[solver_name], maze)
+    timer.run('cycles', maze_solver.count_cycles, unsolved_maze)
+    timer.run('render', maze_solver.print_maze, maze, io.BytesIO())
+
+
+def benchmark(data, size, solver_name, repeat):
+    '''Runs the pipeline repeat times, and then once more for measuring the
+    memory (if tracemalloc is available).
+
+    Returns the StageTimer.
+    '''
+
+    timer = StageTimer()
+    for i in range(repeat):
+        run_pipeline(timer, data, solver_name, size)
+    if tracemalloc:
+        timer.tracing = True
+        run_pipeline(timer, data, solver_name, size)
+    return timer
+
+
+def max_rss():
+    '''Returns the peak resident memory of this process, in bytes, or None.'''
+
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, while macOS reports bytes.
+    if sys.platform != 'darwin':
+        rss *= 1024
+    return rss
+
+
+def compare(results, baseline, tolerance):
+    '''Compares two lists of results and returns the list of regressions,
+    as strings.'''
+
+    old_results = dict(
+        ((result['size'], result['solver']), result) for result in baseline)
+    regressions = []
+    for result in results:
+        old = old_results.get((result['size'], result['solver']))
+        if old is None:
+            continue
+        for stage in STAGES:
+            new_time = result['times'].get(stage)
+            old_time = old['times'].get(stage)
+            if new_time is None or old_time is None:
+                continue
+            if (new_time > old_time * (1 + tolerance) and
+                    new_time > MINIMUM_TIME):
+                regressions.append(
+                    '{0}x{0} {1} {2}: {3:.4f}s -> {4:.4f}s ({5:+.0%})'.format(
+                        result['size'], result['solver'], stage, old_time,
+                        new_time, new_time / old_time - 1))
+    return regressions
+
+
+def print_table(results, output=sys.stdout):
+    '''Prints the times of each stage, in milliseconds.'''
+
+    header = ['size', 'solver'] + STAGES + ['total']
+    rows = []
+    for result in results:
+        times = [result['times'][stage] for stage in STAGES]
+        rows.append(
+            [str(result['size']), result['solver']] +
+            ['{0:.1f}'.format(t * 1000) for t in times + [sum(times)]])
+    widths = [max(len(row[i]) for row in rows + [header])
+              for i in range(len(header))]
+    for row in [header] + rows:
+        print('  '.join(text.rjust(width)
+                        for text, width in zip(row, widths)), file=output)
+
+
+def main():
+    options = parse_arguments()
+
+    results = []
+    for size in options.sizes:
+        data = generate_picture(size, options.loops, options.seed)
+        for solver_name in options.solvers:
+            timer = benchmark(data, size, solver_name, options.repeat)
+            results.append({
+                'size': size,
+                'solver': solver_name,
+                'times': timer.times,
+                'peak_memory': timer.peaks,
+            })
+    print_table(results)
+
+    report = {
+        'version': VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': options.repeat,
+        'loops': options.loops,
+        'seed': options.seed,
+        'max_rss': max_rss(),
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if options.baseline:
+        baseline = json.load(options.baseline)
+        if baseline.get('version') != VERSION:
+            sys.exit('The baseline was written by another version of this '
+                     'script.')
+        regressions = compare(results, baseline['results'], options.tolerance)
+        if regressions:
+            print('Regressions (tolerance {0:.0%}):'.format(
+                options.tolerance))
+            for regression in regressions:
+                print('  ' + regression)
+            sys.exit(1)
+        print('No regressions (tolerance {0:.0%}).'.format(options.tolerance))
+
+
+if __name__ == '__main__':
+    main()
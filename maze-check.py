@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4 sw=4 et
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import re
+import sys
+import textwrap
+import numpy
+
+import maze_solver
+
+
+# Solvers that must find paths of the same length.
+PATH_SOLVERS = ['bfs', 'astar', 'bidirectional', 'junctions']
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description=textwrap.dedent('''
+        Checks that the solvers of maze-solver.py agree with each other, on
+        random grids of cells.
+
+        Random grids are much harder than real mazes: they have any number of
+        special cells, isolated cells, closed loops and passages leaving the
+        grid. For each grid:
+          - the dead-end solvers (reference, queue and wavefront) must give
+            the same solved grid and the same number of dead-ends on each
+            passage;
+          - the path solvers (bfs, astar, bidirectional and junctions) must
+            find paths of the same length;
+          - count_cycles() and JunctionGraph.count_cycles() must agree.
+
+        Then a PDF file is read by PdfReader, which must find a maze that can
+        be solved on its first page, and must still decode the same images
+        after its cross-reference table is damaged in several ways.
+
+        The exit status is non-zero if any check fails.
+        '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-n', '--grids',
+        action='store',
+        type=int,
+        default=300,
+        help='number of random grids to check (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--max-size',
+        action='store',
+        type=int,
+        default=30,
+        metavar='N',
+        help='''
+        maximum width and height of the grids, in cells (default:
+        %(default)s)
+        '''
+    )
+    parser.add_argument(
+        '--pdf',
+        action='store',
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'Desafio-labirinto-Desenvolvedor.pdf'),
+        metavar='FILE',
+        help='''
+        PDF file with a maze, whose cross-reference must be a table (default:
+        the one next to this script); an empty name skips the PDF checks
+        '''
+    )
+    parser.add_argument(
+        '-s', '--seed',
+        action='store',
+        type=int,
+        default=0,
+        help='seed used for generating the grids (default: %(default)s)'
+    )
+
+    args = parser.parse_args()
+    if args.grids < 0:
+        parser.error('--grids must not be negative')
+    if args.max_size < 1:
+        parser.error('--max-size must be at least 1')
+    return args
+
+
+def random_grid(rng, max_size):
+    '''Returns a random array of packed cells, as in MazeGrid.cells.
+
+    Each passage is open with the same probability, which is itself random,
+    so there are grids of all densities.
+    '''
+
+    height, width = rng.randint(1, max_size + 1, size=2)
+    density = rng.random_sample()
+    vertical = rng.random_sample((height + 1, width)) < density
+    horizontal = rng.random_sample((height, width + 1)) < density
+
+    cells = numpy.zeros((height, width), dtype=numpy.uint8)
+    cells[vertical[:-1]] |= maze_solver.UP
+    cells[vertical[1:]] |= maze_solver.DOWN
+    cells[horizontal[:, :-1]] |= maze_solver.LEFT
+    cells[horizontal[:, 1:]] |= maze_solver.RIGHT
+    # About three special cells per grid, and sometimes fewer than two.
+    special = rng.random_sample((height, width)) < 3 / (height * width)
+    cells[special] |= maze_solver.SPECIAL
+    return cells
+
+
+def check_dead_end_solvers(cells):
+    '''The dead-end solvers must agree with the reference one.'''
+
+    results = []
+    for name in maze_solver.DEAD_END_SOLVERS:
+        grid = maze_solver.MazeGrid(cells.copy())
+        results.append((name, maze_solver.SOLVERS[name](grid), grid))
+
+    _, expected_counts, expected_grid = results[0]
+    for name, counts, grid in results[1:]:
+        assert counts == expected_counts, (
+            '{0} removed {1} dead-ends per passage, instead of {2}'.format(
+                name, counts, expected_counts))
+        assert numpy.array_equal(grid.cells, expected_grid.cells), (
+            '{0} left another grid than reference'.format(name))
+
+
+def check_path_solvers(cells):
+    '''The path solvers must find shortest paths, of the same length.'''
+
+    lengths = {}
+    for name in PATH_SOLVERS:
+        grid = maze_solver.MazeGrid(cells.copy())
+        lengths[name] = len(maze_solver.SOLVERS[name](grid))
+    assert len(set(lengths.values())) == 1, (
+        'the paths have different lengths: {0}'.format(', '.join(
+            '{0} {1}'.format(name, lengths[name]) for name in PATH_SOLVERS)))
+
+
+def check_cycles(cells):
+    '''Counting the cycles on the junction graph must give the same result.
+    '''
+
+    grid = maze_solver.MazeGrid(cells)
+    expected = maze_solver.count_cycles(grid)
+    num_cycles = maze_solver.JunctionGraph.from_grid(grid).count_cycles()
+    assert num_cycles == expected, (
+        'JunctionGraph.count_cycles() found {0} cycles instead of {1}'.format(
+            num_cycles, expected))
+
+
+CHECKS = [check_dead_end_solvers, check_path_solvers, check_cycles]
+
+
+def damaged_pdfs(data):
+    '''Yields (description, data) tuples of copies of a PDF file with a
+    broken cross-reference, which PdfReader must recover from by scanning
+    the whole file.'''
+
+    table = data.rindex(b'xref', 0, data.rindex(b'startxref'))
+    header = re.compile(br'(\d+)\s+(\d+)').search(data, table)
+    yield 'wrong subsection count', b''.join([
+        data[:header.start(2)],
+        str(int(header.group(2)) + 3).encode('ascii'),
+        data[header.end(2):]])
+    yield 'garbled entries', b''.join([
+        data[:header.end()], b'\ngarbage', data[header.end() + 9:]])
+    yield 'missing table', data[:table] + b'garbage' + data[table + 4:]
+
+    startxref = data.rindex(b'startxref')
+    yield 'invalid startxref', data[:startxref] + b'startxref\nnone\n%%EOF\n'
+
+
+def check_pdf(filename):
+    '''The PDF must hold a maze, and the images of all its pages must still
+    be decoded after damaging it.'''
+
+    with open(filename, 'rb') as f:
+        data = f.read()
+    reader = maze_solver.PdfReader(io.BytesIO(data))
+    images = [reader.page_image(page).tobytes()
+              for page in range(1, len(reader.pages) + 1)]
+
+    maze = maze_solver.load_maze(reader.page_image(1))
+    assert maze.width > 1 and maze.height > 1, (
+        'the maze of the first page has {0}x{1} cells'.format(
+            maze.width, maze.height))
+    assert maze_solver.find_shortest_path(maze), (
+        'the maze of the first page has no solution')
+
+    for description, damaged in damaged_pdfs(data):
+        reader = maze_solver.PdfReader(io.BytesIO(damaged))
+        assert len(reader.pages) == len(images), (
+            'with {0}, {1} pages were found instead of {2}'.format(
+                description, len(reader.pages), len(images)))
+        for page, image in enumerate(images, 1):
+            assert reader.page_image(page).tobytes() == image, (
+                'with {0}, page {1} was decoded differently'.format(
+                    description, page))
+
+
+def main():
+    options = parse_arguments()
+
+    rng = numpy.random.RandomState(options.seed)
+    failures = 0
+    for i in range(options.grids):
+        cells = random_grid(rng, options.max_size)
+        for check in CHECKS:
+            try:
+                check(cells)
+            except AssertionError as e:
+                failures += 1
+                print('Grid {0} ({1}x{2}): {3}'.format(
+                    i, cells.shape[1], cells.shape[0], e))
+                maze_solver.print_maze(maze_solver.MazeGrid(cells))
+    print('{0} grids checked, {1} failures.'.format(options.grids, failures))
+
+    if options.pdf:
+        try:
+            check_pdf(options.pdf)
+        except AssertionError as e:
+            failures += 1
+            print('{0}: {1}'.format(options.pdf, e))
+        else:
+            print('{0} checked.'.format(options.pdf))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
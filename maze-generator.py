@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4 sw=4 et
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import random
+import sys
+import textwrap
+import numpy
+from PIL import Image
+
+
+# Palette indexes of the generated pictures.
+WHITE = 0
+BLACK = 1
+SPECIAL = 2
+PALETTE = [255, 255, 255, 0, 0, 0, 255, 0, 0]
+
+# Formats that cannot save palette images.
+RGB_EXTENSIONS = ['.jpeg', '.jpg', '.pnm', '.ppm']
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description=textwrap.dedent('''
+        Generates random maze pictures that can be solved by maze-solver.py,
+        mostly for testing and benchmarking it with large mazes.
+
+        The picture has a white background, 1-pixel black walls aligned to a
+        grid, and two red special cells: the top-left and the bottom-right
+        ones.
+
+        maze-solver.py takes every line and column of pixels that is more than
+        one third black as a wall line. Mazes where that guess would be wrong
+        are refused; this happens with lines of mostly open walls (more likely
+        with larger cells, more loops and small mazes), and with mazes only
+        one cell wide.
+        '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-W', '--width',
+        action='store',
+        type=int,
+        default=100,
+        help='width of the maze, in cells (default: %(default)s)'
+    )
+    parser.add_argument(
+        '-H', '--height',
+        action='store',
+        type=int,
+        default=100,
+        help='height of the maze, in cells (default: %(default)s)'
+    )
+    parser.add_argument(
+        '-c', '--cell-size',
+        action='store',
+        type=int,
+        default=5,
+        help='''
+        distance between walls, in pixels; must be at least 4 (default:
+        %(default)s)
+        '''
+    )
+    parser.add_argument(
+        '-b', '--border',
+        action='store',
+        type=int,
+        default=10,
+        help='white border around the maze, in pixels (default: %(default)s)'
+    )
+    parser.add_argument(
+        '-a', '--algorithm',
+        action='store',
+        choices=sorted(ALGORITHMS),
+        default='backtracker',
+        help='''
+        algorithm used for building a perfect maze; binary-tree is fully
+        vectorized, and thus much faster for huge mazes, but its mazes are
+        very biased (default: %(default)s)
+        '''
+    )
+    parser.add_argument(
+        '-l', '--loops',
+        action='store',
+        type=float,
+        default=0,
+        metavar='FRACTION',
+        help='''
+        fraction of the remaining inner walls that are removed after
+        building a perfect maze, creating cycles; the more are removed, the
+        more likely the maze is refused, unless the cells are small (default:
+        %(default)s)
+        '''
+    )
+    parser.add_argument(
+        '-n', '--noise',
+        action='store',
+        type=int,
+        metavar='QUALITY',
+        help='''
+        add JPEG artifacts, by compressing the picture with this JPEG quality
+        (1 to 95) before saving it
+        '''
+    )
+    parser.add_argument(
+        '-s', '--seed',
+        action='store',
+        type=int,
+        help='seed for the random number generators'
+    )
+    parser.add_argument(
+        'output',
+        action='store',
+        help='output picture file name; the format comes from its extension'
+    )
+
+    args = parser.parse_args()
+    if args.width < 1 or args.height < 1:
+        parser.error('the maze must have at least one cell')
+    if args.cell_size < 4:
+        parser.error('--cell-size must be at least 4')
+    if args.border < 0:
+        parser.error('--border must not be negative')
+    if not 0 <= args.loops <= 1:
+        parser.error('--loops must be between 0 and 1')
+    if args.noise is not None and not 1 <= args.noise <= 95:
+        parser.error('--noise must be between 1 and 95')
+    return args
+
+
+def empty_maze(width, height):
+    '''Returns a maze with all walls closed, as a tuple of two boolean
+    arrays:
+    - vertical[j, i] is True if one can cross the j-th horizontal wall line
+      at the i-th column. Its shape is (height + 1, width).
+    - horizontal[j, i] is True if one can cross the i-th vertical wall line
+      at the j-th row. Its shape is (height, width + 1).
+    '''
+
+    vertical = numpy.zeros((height + 1, width), dtype=bool)
+    horizontal = numpy.zeros((height, width + 1), dtype=bool)
+    return vertical, horizontal
+
+
+def build_backtracker(width, height, rng):
+    '''Builds a perfect maze using a randomized depth-first search.'''
+
+    vertical, horizontal = empty_maze(width, height)
+    # Flat views, indexed by j * width + i and by j * (width + 1) + i.
+    vertical_flat = vertical.reshape(-1)
+    horizontal_flat = horizontal.reshape(-1)
+
+    visited = bytearray(width * height)
+    visited[0] = 1
+    stack = [0]
+    while stack:
+        index = stack[-1]
+        y, x = divmod(index, width)
+
+        # Tuples of (neighbor index, passage array, passage index).
+        neighbors = []
+        if y > 0 and not visited[index - width]:
+            neighbors.append((index - width, vertical_flat, index))
+        if y < height - 1 and not visited[index + width]:
+            neighbors.append((index + width, vertical_flat, index + width))
+        if x > 0 and not visited[index - 1]:
+            neighbors.append((index - 1, horizontal_flat, index + y))
+        if x < width - 1 and not visited[index + 1]:
+            neighbors.append((index + 1, horizontal_flat, index + y + 1))
+
+        if not neighbors:
+            stack.pop()
+            continue
+
+        other, passages, passage = rng.choice(neighbors)
+        passages[passage] = True
+        visited[other] = 1
+        stack.append(other)
+
+    return vertical, horizontal
+
+
+def build_binary_tree(width, height, rng):
+    '''Builds a perfect maze using the binary tree algorithm.
+
+    Each cell opens a passage either up or right, chosen at random. Cells on
+    the top row can only go right, and cells on the right column can only go
+    up.
+    '''
+
+    vertical, horizontal = empty_maze(width, height)
+    numpy_rng = numpy.random.RandomState(rng.randrange(2 ** 32))
+
+    go_up = numpy_rng.randint(2, size=(height, width)).astype(bool)
+    go_up[0, :] = False
+    go_up[:, -1] = True
+    go_up[0, -1] = False
+
+    vertical[:-1, :] = go_up
+    vertical[0, :] = False
+    horizontal[:, 1:] = ~go_up
+    horizontal[0, -1] = False
+    return vertical, horizontal
+
+
+ALGORITHMS = {
+    'backtracker': build_backtracker,
+    'binary-tree': build_binary_tree,
+}
+
+
+def add_loops(vertical, horizontal, fraction, rng):
+    '''Opens a random fraction of the closed inner walls, in place.'''
+
+    numpy_rng = numpy.random.RandomState(rng.randrange(2 ** 32))
+    for passages in [vertical[1:-1, :], horizontal[:, 1:-1]]:
+        passages |= numpy_rng.random_sample(passages.shape) < fraction
+
+
+def draw_maze(vertical, horizontal, cell_size, border):
+    '''Returns a palette image of the maze.
+
+    The top-left and bottom-right cells are painted as special.
+    '''
+
+    width = vertical.shape[1]
+    height = horizontal.shape[0]
+    pixels = numpy.full(
+        (height * cell_size + 1 + 2 * border,
+         width * cell_size + 1 + 2 * border), WHITE, dtype=numpy.uint8)
+    grid = pixels[border:border + height * cell_size + 1,
+                  border:border + width * cell_size + 1]
+
+    # Horizontal wall lines. Each closed wall covers cell_size pixels, and
+    # the corners between walls are always black.
+    walls = numpy.zeros((height + 1, width * cell_size + 1), dtype=bool)
+    walls[:, :-1] = numpy.repeat(~vertical, cell_size, axis=1)
+    walls[:, ::cell_size] = True
+    grid[::cell_size][walls] = BLACK
+
+    # Vertical wall lines.
+    walls = numpy.zeros((height * cell_size + 1, width + 1), dtype=bool)
+    walls[:-1, :] = numpy.repeat(~horizontal, cell_size, axis=0)
+    walls[::cell_size, :] = True
+    grid[:, ::cell_size][walls] = BLACK
+
+    for x, y in [(0, 0), (width - 1, height - 1)]:
+        grid[y * cell_size + 1:(y + 1) * cell_size,
+             x * cell_size + 1:(x + 1) * cell_size] = SPECIAL
+
+    img = Image.fromarray(pixels, 'P')
+    img.putpalette(PALETTE)
+    return img
+
+
+def misdetected_lines(img, cell_size, border):
+    '''Returns how many lines and columns of pixels of a picture returned by
+    draw_maze() would be misdetected by find_walls() in maze-solver.py, which
+    takes those more than one third black as wall lines.'''
+
+    pixels = numpy.asarray(img)
+    height, width = pixels.shape
+    blacks = pixels[border:height - border, border:width - border] == BLACK
+
+    errors = 0
+    for profile, length in [(blacks.sum(axis=1), blacks.shape[1]),
+                            (blacks.sum(axis=0), blacks.shape[0])]:
+        is_wall = numpy.arange(len(profile)) % cell_size == 0
+        errors += numpy.count_nonzero((profile > length / 3) != is_wall)
+    return errors
+
+
+def add_noise(img, quality):
+    '''Returns the image after compressing it as JPEG.'''
+
+    data = io.BytesIO()
+    img.convert('RGB').save(data, 'JPEG', quality=quality)
+    data.seek(0)
+    return Image.open(data)
+
+
+def main():
+    options = parse_arguments()
+    rng = random.Random(options.seed)
+
+    build = ALGORITHMS[options.algorithm]
+    vertical, horizontal = build(options.width, options.height, rng)
+    if options.loops:
+        add_loops(vertical, horizontal, options.loops, rng)
+
+    img = draw_maze(vertical, horizontal, options.cell_size, options.border)
+    errors = misdetected_lines(img, options.cell_size, options.border)
+    if errors:
+        sys.exit('maze-solver.py would misdetect the walls of this maze ({0} '
+                 'lines of pixels); try fewer --loops, a smaller --cell-size '
+                 'or another --seed.'.format(errors))
+    if options.noise is not None:
+        img = add_noise(img, options.noise)
+    if os.path.splitext(options.output)[1].lower() in RGB_EXTENSIONS:
+        img = img.convert('RGB')
+    img.save(options.output)
+
+
+if __name__ == '__main__':
+    main()
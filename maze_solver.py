@@ -0,0 +1,3011 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4 sw=4 et
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import array
+import collections
+import contextlib
+import cProfile
+import errno
+import functools
+import glob
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import signal
+import sys
+import textwrap
+import timeit
+import zlib
+import numpy
+from PIL import Image
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+try:
+    from zipfile import BadZipFile
+except ImportError:
+    # Python 2
+    from zipfile import BadZipfile as BadZipFile
+try:
+    from itertools import izip as zip
+except ImportError:
+    # Python 3, where zip() is already lazy
+    pass
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+
+# Thresholded pixels are stored as a single byte, with one bit per RGB channel
+# (red is bit 0, green is bit 1, blue is bit 2). A bit is set if that channel
+# was brighter than the threshold used by pixel_preprocessing().
+BLACK = 0
+WHITE = 7
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description=textwrap.dedent('''
+        Given a rectangular maze as an image, this script will parse the image
+        and solve the maze.
+
+        This script was written by Denilson Sá <denilsonsa@gmail.com> as a
+        challenge to solve a maze that was supplied as a PDF file.
+
+        The PDF file can be given directly, and the largest image of each
+        page is solved. Alternatively, the picture can be extracted first:
+        $ pdfimages -j Desafio-labirinto-Desenvolvedor.pdf foo
+        $ mv foo-002.ppm maze.ppm
+        $ rm -f foo-*.ppm
+        Optional (just to save space):
+        $ convert maze.ppm maze.png
+
+        Binary PGM and PPM pictures (such as maze.ppm) are memory-mapped
+        instead of decoded, which is faster and uses less memory for huge
+        pictures.
+        '''),
+        epilog=textwrap.dedent('''
+        This script expects a maze picture such as:
+        - It is a rectangular grid.
+        - Empty space is white.
+        - Walls are black.
+        - Walls are always perfectly aligned with the grid.
+        - Walls are 1 pixel thick.
+        - Each wall is a few pixels away from each other (i.e. each cell is a
+          few pixels wide).
+        - A cell is considered special (i.e. the start/finish) if the middle
+          pixels are neither white nor black. The color must be saturated
+          enough to survive the preprocessing phase. Colors such as #FF0000 are
+          good choices.
+        '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-i', '--save-intermediate',
+        action='store_true',
+        help='''
+        save intermediate images as 01-preprocessed.png and 02-autocropped.png
+        '''
+    )
+    parser.add_argument(
+        '-v', '--verboseness',
+        action='store',
+        type=int,
+        choices=[0, 1, 2, 3],
+        # 0: Only the solution
+        # 1: + the input maze
+        # 2: + the number of dead-ends removed
+        #    + the message 'does not contain cycles'
+        # 3: + the maze after each dead-end removal iteration
+        #    + the maze after removing the cycles.
+        default=1,
+        help='''
+        control how much information will be printed at the output
+        '''
+    )
+    parser.add_argument(
+        '-s', '--solver',
+        action='store',
+        choices=sorted(SOLVERS),
+        default='queue',
+        help='''
+        algorithm used for solving the maze; junctions pays off on mazes of
+        long corridors, but not on open areas (default: %(default)s)
+        '''
+    )
+    parser.add_argument(
+        '-o', '--output-image',
+        action='store',
+        metavar='FILE',
+        help='''
+        save a picture of the solution, drawn over the preprocessed and
+        auto-cropped maze
+        '''
+    )
+    parser.add_argument(
+        '--wave-format',
+        action='store',
+        choices=WavePrinter.MODES,
+        default='full',
+        help='''
+        how the maze is printed after each dead-end removal iteration, at
+        verboseness 3: the full maze, only the changed cells, or redrawing
+        the changed cells in place using ANSI escape sequences (default:
+        %(default)s)
+        '''
+    )
+    parser.add_argument(
+        '--wave-every',
+        action='store',
+        type=int,
+        default=1,
+        metavar='N',
+        help='''
+        at verboseness 3, print the maze only once every N dead-end removal
+        iterations (default: %(default)s)
+        '''
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_false',
+        dest='cache',
+        help='''
+        do not read or write the result cache; the cache is also skipped
+        when --save-intermediate or verboseness 2 or higher are used
+        '''
+    )
+    parser.add_argument(
+        '--cache-dir',
+        action='store',
+        default=os.path.join(
+            os.environ.get('XDG_CACHE_HOME') or
+            os.path.join(os.path.expanduser('~'), '.cache'),
+            'maze-solver'),
+        help='''
+        directory of the result cache (default: %(default)s)
+        '''
+    )
+    parser.add_argument(
+        '--cache-size',
+        action='store',
+        type=float,
+        default=100,
+        metavar='MB',
+        help='''
+        maximum size of the result cache, in megabytes; the least recently
+        used entries are removed when it grows beyond that (default:
+        %(default)s)
+        '''
+    )
+    parser.add_argument(
+        '-b', '--batch',
+        action='store',
+        metavar='DIR|GLOB',
+        help='''
+        solve all files in a directory (or matching a glob pattern) instead of
+        a single imgfile, printing one JSON record per line as each file is
+        solved
+        '''
+    )
+    parser.add_argument(
+        '--serve',
+        action='store',
+        type=int,
+        metavar='PORT',
+        help='''
+        instead of solving imgfile, keep running as an HTTP server on
+        127.0.0.1:PORT; POST the picture to /solve, or GET
+        /solve?path=FILE, optionally adding solver=NAME, format=json and
+        page=N (for PDF files)
+        '''
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        action='store',
+        type=int,
+        default=None,
+        help='''
+        number of worker processes for --batch, --serve and multi-page PDF
+        files (default: number of CPUs)
+        '''
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='''
+        print to stderr how long each stage took, the peak memory allocated
+        during each stage (Python 3 only; tracing the memory makes the Python
+        code slower) and a few counters, such as the number of dead-end
+        removal iterations
+        '''
+    )
+    parser.add_argument(
+        '--profile-output',
+        action='store',
+        metavar='FILE',
+        help='''
+        also save the statistics of cProfile to FILE, to be read by the
+        pstats module; implies --profile
+        '''
+    )
+    parser.add_argument(
+        'imgfile',
+        action='store',
+        nargs='?',
+        type=argparse.FileType('rb'),
+        help='''
+        the picture of the maze, or a PDF file with the picture; the pages of
+        multi-page PDF files are solved as in --batch mode, and the options
+        that only apply to a single maze, such as --output-image, cannot be
+        used with them
+        '''
+    )
+
+    args = parser.parse_args()
+    modes = [args.imgfile, args.batch, args.serve]
+    if len([mode for mode in modes if mode is not None]) != 1:
+        parser.error(
+            'exactly one of imgfile, --batch or --serve must be given')
+    if args.wave_every < 1:
+        parser.error('--wave-every must be at least 1')
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    if args.profile_output:
+        args.profile = True
+    if args.profile and args.imgfile is None:
+        parser.error('--profile only works with a single imgfile')
+    return args
+
+
+def pixel_preprocessing(pix):
+    '''Maps pixel values to other values. Should be passed to Image.point().
+    '''
+
+    if pix > 127:
+        return 255
+    else:
+        return 0
+
+
+def preprocess_image(img):
+    '''Thresholds an image and returns it as a 2D numpy array of uint8.
+
+    This is the vectorized equivalent of img.convert('RGB').point(
+    pixel_preprocessing), but the three thresholded channels are packed into
+    a single byte per pixel (see BLACK and WHITE). Any other value means the
+    pixel is colored.
+    '''
+
+    return threshold_pixels(numpy.asarray(img.convert('RGB')))
+
+
+def threshold_pixels(array, maxval=255):
+    '''Thresholds an array of RGB (height, width, 3) or grayscale (height,
+    width) pixels, whose values go up to maxval, into the format returned by
+    preprocess_image().
+
+    The array is read in blocks of rows, so the temporary arrays stay small
+    and a memory-mapped array is read sequentially.
+    '''
+
+    threshold = 127 * maxval // 255
+    height, width = array.shape[:2]
+    pixels = numpy.empty((height, width), dtype=numpy.uint8)
+    block_rows = max(1, (1 << 20) // max(1, width))
+    for start in range(0, height, block_rows):
+        block = array[start:start + block_rows]
+        out = pixels[start:start + block_rows]
+        if array.ndim == 2:
+            out[...] = (block > threshold).view(numpy.uint8) * WHITE
+        else:
+            out[...] = (block[:, :, 0] > threshold).view(numpy.uint8)
+            out |= (block[:, :, 1] > threshold).view(numpy.uint8) << 1
+            out |= (block[:, :, 2] > threshold).view(numpy.uint8) << 2
+    return pixels
+
+
+# Number of channels of each binary netpbm format.
+NETPBM_CHANNELS = {b'P5': 1, b'P6': 3}
+
+
+def read_netpbm_header(f):
+    '''Parses the header of a binary PGM (P5) or PPM (P6) file.
+
+    Returns a tuple of (channels, width, height, maxval), leaving f at the
+    first byte of the pixels, or None if f holds another kind of picture.
+    '''
+
+    magic = f.read(2)
+    if magic not in NETPBM_CHANNELS:
+        return None
+    channels = NETPBM_CHANNELS[magic]
+
+    # Width, height and maxval are separated by whitespace and comments, and
+    # a single whitespace character comes before the pixels.
+    fields = []
+    token = b''
+    while len(fields) < 3:
+        c = f.read(1)
+        if not c:
+            raise ValueError('Truncated netpbm header')
+        if c.isspace() or c == b'#':
+            if token:
+                fields.append(int(token))
+                token = b''
+            if c == b'#':
+                f.readline()
+        else:
+            token += c
+
+    width, height, maxval = fields
+    if width < 1 or height < 1 or not 0 < maxval < 65536:
+        raise ValueError('Invalid netpbm header')
+    return channels, width, height, maxval
+
+
+def map_netpbm(imgfile):
+    '''Memory-maps the pixels of a binary PGM or PPM file (a file name or a
+    file object), without decoding nor copying them.
+
+    Returns a tuple of (read-only array, maxval), as expected by
+    threshold_pixels(), or None if the file is of another kind or cannot be
+    memory-mapped (such as a pipe or an in-memory file).
+    '''
+
+    if not hasattr(imgfile, 'read'):
+        with open(imgfile, 'rb') as f:
+            return map_netpbm(f)
+
+    try:
+        imgfile.fileno()
+        start = imgfile.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+    header = read_netpbm_header(imgfile)
+    offset = imgfile.tell()
+    imgfile.seek(start)
+    if header is None:
+        return None
+
+    channels, width, height, maxval = header
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    # Samples larger than a byte are big-endian.
+    dtype = numpy.uint8 if maxval < 256 else numpy.dtype('>u2')
+    array = numpy.memmap(imgfile, dtype=dtype, mode='r', offset=offset,
+                         shape=shape)
+    return array, maxval
+
+
+def is_pdf(f):
+    '''Returns True if the seekable file object f holds a PDF file, leaving
+    it at the same position.'''
+
+    start = f.tell()
+    header = f.read(1024)
+    f.seek(start)
+    return b'%PDF-' in header
+
+
+class PdfName(str):
+    '''A PDF name, such as /Image, without the slash.'''
+
+
+# Indirect references, such as "5 0 R".
+PdfRef = collections.namedtuple('PdfRef', 'num gen')
+
+
+class PdfStream(object):
+    '''A PDF stream: its dictionary and its raw (still encoded) data.'''
+
+    def __init__(self, dict, data):
+        self.dict = dict
+        self.data = data
+
+
+PDF_SKIP = re.compile(br'(?:[\0\t\n\x0c\r ]+|%[^\r\n]*)*')
+PDF_REGULAR = re.compile(br'[^\0\t\n\x0c\r ()<>\[\]{}/%]*')
+PDF_REF = re.compile(br'(\d+)\s+(\d+)\s+R(?![^\0\t\n\x0c\r ()<>\[\]{}/%])')
+PDF_OBJ = re.compile(br'\s*(\d+)\s+(\d+)\s+obj')
+PDF_XREF_SUBSECTION = re.compile(br'(\d+)\s+(\d+)')
+PDF_XREF_ENTRY = re.compile(br'\s*(\d{10})\s+(\d{5})\s+([nf])')
+PDF_ESCAPES = {
+    b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f',
+    b'\n': b'', b'\r': b'',
+}
+
+
+def parse_pdf_value(data, pos):
+    '''Parses the PDF object starting at data[pos].
+
+    Dictionaries are returned as dict, arrays as list, names as PdfName,
+    strings as bytes, and references as PdfRef.
+
+    Returns a tuple of (value, position after the value).
+    '''
+
+    pos = PDF_SKIP.match(data, pos).end()
+    c = data[pos:pos + 1]
+
+    if c == b'/':
+        end = PDF_REGULAR.match(data, pos + 1).end()
+        name = re.sub(br'#([0-9A-Fa-f]{2})',
+                      lambda m: bytes(bytearray([int(m.group(1), 16)])),
+                      data[pos + 1:end])
+        return PdfName(name.decode('latin-1')), end
+
+    if data.startswith(b'<<', pos):
+        value = {}
+        pos += 2
+        while True:
+            pos = PDF_SKIP.match(data, pos).end()
+            if data.startswith(b'>>', pos):
+                return value, pos + 2
+            if pos >= len(data):
+                raise ValueError('Unterminated PDF dictionary')
+            key, pos = parse_pdf_value(data, pos)
+            value[key], pos = parse_pdf_value(data, pos)
+
+    if c == b'[':
+        value = []
+        pos += 1
+        while True:
+            pos = PDF_SKIP.match(data, pos).end()
+            if data.startswith(b']', pos):
+                return value, pos + 1
+            if pos >= len(data):
+                raise ValueError('Unterminated PDF array')
+            item, pos = parse_pdf_value(data, pos)
+            value.append(item)
+
+    if c == b'<':
+        end = data.index(b'>', pos)
+        digits = re.sub(br'\s', b'', data[pos + 1:end])
+        if len(digits) % 2:
+            digits += b'0'
+        return bytes(bytearray.fromhex(digits.decode('ascii'))), end + 1
+
+    if c == b'(':
+        value = bytearray()
+        depth = 0
+        pos += 1
+        while True:
+            c = data[pos:pos + 1]
+            if not c:
+                raise ValueError('Unterminated PDF string')
+            pos += 1
+            if c == b'\\':
+                c = data[pos:pos + 1]
+                pos += 1
+                octal = re.match(br'[0-7]{1,3}', data[pos - 1:pos + 2])
+                if octal:
+                    pos += len(octal.group()) - 1
+                    value.append(int(octal.group(), 8) & 0xFF)
+                    continue
+                if c == b'\r' and data[pos:pos + 1] == b'\n':
+                    pos += 1
+                value += PDF_ESCAPES.get(c, c)
+                continue
+            if c == b'(':
+                depth += 1
+            elif c == b')':
+                if depth == 0:
+                    return bytes(value), pos
+                depth -= 1
+            value += c
+
+    match = PDF_REF.match(data, pos)
+    if match:
+        return PdfRef(int(match.group(1)), int(match.group(2))), match.end()
+
+    end = PDF_REGULAR.match(data, pos).end()
+    token = data[pos:end]
+    if not token:
+        raise ValueError('Invalid PDF syntax at offset {0}'.format(pos))
+    if token in (b'true', b'false'):
+        return token == b'true', end
+    if token == b'null':
+        return None, end
+    try:
+        if b'.' in token:
+            return float(token), end
+        return int(token), end
+    except ValueError:
+        raise ValueError('Invalid PDF syntax at offset {0}'.format(pos))
+
+
+def unpredict(data, parms):
+    '''Undoes the PNG or TIFF predictor of FlateDecode, as described by the
+    DecodeParms dictionary.'''
+
+    predictor = parms.get('Predictor', 1)
+    if predictor == 1:
+        return data
+    colors = parms.get('Colors', 1)
+    bits = parms.get('BitsPerComponent', 8)
+    columns = parms.get('Columns', 1)
+    row_length = (columns * colors * bits + 7) // 8
+    bpp = max(1, colors * bits // 8)
+
+    if predictor == 2:
+        if bits != 8:
+            raise ValueError('Unsupported TIFF predictor with {0} bits'.format(
+                bits))
+        rows = numpy.frombuffer(data, dtype=numpy.uint8)
+        rows = rows[:len(rows) // row_length * row_length].reshape(
+            -1, columns, colors)
+        return numpy.cumsum(rows, axis=1, dtype=numpy.uint8).tobytes()
+
+    # PNG predictors: each row starts with the byte of its filter type.
+    rows = numpy.frombuffer(data, dtype=numpy.uint8)
+    rows = rows[:len(rows) // (row_length + 1) * (row_length + 1)].reshape(
+        -1, row_length + 1)
+    output = numpy.zeros((len(rows) + 1, row_length), dtype=numpy.uint8)
+    for j, (filter_type, row) in enumerate(zip(rows[:, 0], rows[:, 1:])):
+        previous = output[j]
+        current = output[j + 1]
+        if filter_type == 0:
+            current[:] = row
+        elif filter_type == 1:
+            # Sub: a running sum along each byte of the pixels.
+            padded = numpy.zeros(-(-row_length // bpp) * bpp, numpy.uint8)
+            padded[:row_length] = row
+            current[:] = numpy.cumsum(
+                padded.reshape(-1, bpp), axis=0,
+                dtype=numpy.uint8).reshape(-1)[:row_length]
+        elif filter_type == 2:
+            current[:] = row + previous
+        elif filter_type in (3, 4):
+            # Average and Paeth depend on the byte just decoded.
+            row = row.tolist()
+            up = previous.tolist()
+            decoded = []
+            for i in range(row_length):
+                left = decoded[i - bpp] if i >= bpp else 0
+                if filter_type == 3:
+                    decoded.append((row[i] + (left + up[i]) // 2) & 0xFF)
+                    continue
+                up_left = up[i - bpp] if i >= bpp else 0
+                p = left + up[i] - up_left
+                pa, pb, pc = abs(p - left), abs(p - up[i]), abs(p - up_left)
+                if pa <= pb and pa <= pc:
+                    predicted = left
+                elif pb <= pc:
+                    predicted = up[i]
+                else:
+                    predicted = up_left
+                decoded.append((row[i] + predicted) & 0xFF)
+            current[:] = decoded
+        else:
+            raise ValueError('Invalid PNG predictor {0}'.format(filter_type))
+    return output[1:].tobytes()
+
+
+class PdfReader(object):
+    '''Reads the images of a PDF file, without any external tool.
+
+    Only what is needed for finding and decoding images is implemented: the
+    cross-reference table (or stream, including object streams), the page
+    tree, and the FlateDecode and DCTDecode filters. If the cross-reference
+    is broken, the objects are found by scanning the whole file.
+    '''
+
+    # Errors raised by malformed files.
+    ERRORS = (ValueError, KeyError, IndexError, TypeError, zlib.error)
+
+    def __init__(self, pdffile):
+        if hasattr(pdffile, 'read'):
+            start = pdffile.tell()
+            self.data = pdffile.read()
+            pdffile.seek(start)
+        else:
+            with open(pdffile, 'rb') as f:
+                self.data = f.read()
+        # Object number -> offset, or (object stream number, index).
+        self.offsets = {}
+        self.objects = {}
+        self.object_streams = {}
+        try:
+            self.trailer = self.read_xref()
+            self.pages = self.get_pages()
+        except self.ERRORS:
+            self.offsets = {}
+            self.objects = {}
+            self.object_streams = {}
+            self.trailer = self.scan_objects()
+            self.pages = self.get_pages()
+
+    def read_xref(self):
+        '''Reads all cross-reference sections, from the last one back through
+        the Prev entries. Returns the trailer dictionary of the last one.'''
+
+        startxref = self.data.rindex(b'startxref')
+        match = re.match(br'startxref\s+(\d+)', self.data[startxref:])
+        if not match:
+            raise ValueError('Invalid PDF startxref')
+        offset = int(match.group(1))
+        trailer = None
+        visited = set()
+        pending = [offset]
+        while pending:
+            offset = pending.pop(0)
+            if offset in visited:
+                continue
+            visited.add(offset)
+            pos = PDF_SKIP.match(self.data, offset).end()
+            if self.data.startswith(b'xref', pos):
+                section = self.read_xref_table(pos + 4)
+            else:
+                section = self.read_xref_stream(offset)
+            if trailer is None:
+                trailer = section
+            # Hybrid files have both a table and a stream.
+            for key in ['XRefStm', 'Prev']:
+                if key in section:
+                    pending.append(section[key])
+        return trailer
+
+    def read_xref_table(self, pos):
+        '''Reads a cross-reference table and returns its trailer.'''
+
+        data = self.data
+        while True:
+            pos = PDF_SKIP.match(data, pos).end()
+            if data.startswith(b'trailer', pos):
+                return parse_pdf_value(data, pos + 7)[0]
+            match = PDF_XREF_SUBSECTION.match(data, pos)
+            if not match:
+                raise ValueError('Invalid PDF xref')
+            first, count = int(match.group(1)), int(match.group(2))
+            pos = match.end()
+            for num in range(first, first + count):
+                match = PDF_XREF_ENTRY.match(data, pos)
+                if not match:
+                    raise ValueError('Invalid PDF xref')
+                pos = match.end()
+                if match.group(3) == b'n':
+                    # Newer sections are read first.
+                    self.offsets.setdefault(num, int(match.group(1)))
+
+    def read_xref_stream(self, offset):
+        '''Reads a cross-reference stream and returns its dictionary.'''
+
+        stream = self.parse_object_at(offset)
+        widths = stream.dict['W']
+        data = bytearray(self.decode_stream(stream))
+        index = stream.dict.get('Index', [0, stream.dict['Size']])
+        pos = 0
+        for first, count in zip(index[::2], index[1::2]):
+            for num in range(first, first + count):
+                fields = []
+                for width in widths:
+                    value = 0
+                    for byte in data[pos:pos + width]:
+                        value = value << 8 | byte
+                    fields.append(value)
+                    pos += width
+                entry_type = fields[0] if widths[0] else 1
+                if entry_type == 1:
+                    self.offsets.setdefault(num, fields[1])
+                elif entry_type == 2:
+                    self.offsets.setdefault(num, (fields[1], fields[2]))
+        return stream.dict
+
+    def scan_objects(self):
+        '''Finds the objects by scanning the file, for broken files. Returns
+        a trailer dictionary.'''
+
+        def try_get(num):
+            try:
+                return self.get(PdfRef(num, 0))
+            except self.ERRORS:
+                return None
+
+        for match in re.finditer(br'(?<!\d)(\d+)\s+(\d+)\s+obj\b', self.data):
+            self.offsets[int(match.group(1))] = match.start()
+        # The objects inside object streams are not found by the scan.
+        for num in list(self.offsets):
+            stream = try_get(num)
+            if (isinstance(stream, PdfStream) and
+                    stream.dict.get('Type') == 'ObjStm'):
+                try:
+                    header = self.read_object_stream(num)[2]
+                except self.ERRORS:
+                    continue
+                for index, member in enumerate(header[::2]):
+                    self.offsets.setdefault(member, (num, index))
+
+        trailer = self.data.rfind(b'trailer')
+        if trailer >= 0:
+            return parse_pdf_value(self.data, trailer + 7)[0]
+        for num in sorted(self.offsets):
+            obj = try_get(num)
+            if isinstance(obj, dict) and obj.get('Type') == 'Catalog':
+                return {'Root': PdfRef(num, 0)}
+        raise ValueError('No PDF catalog found')
+
+    def parse_object_at(self, offset):
+        '''Parses the indirect object ("N G obj ...") starting at offset.'''
+
+        match = PDF_OBJ.match(self.data, offset)
+        if not match:
+            raise ValueError('No PDF object at offset {0}'.format(offset))
+        value, pos = parse_pdf_value(self.data, match.end())
+        pos = PDF_SKIP.match(self.data, pos).end()
+        if not (isinstance(value, dict) and
+                self.data.startswith(b'stream', pos)):
+            return value
+        pos += len(b'stream')
+        if self.data.startswith(b'\r\n', pos):
+            pos += 2
+        elif self.data[pos:pos + 1] in (b'\n', b'\r'):
+            pos += 1
+        length = self.resolve(value['Length'])
+        return PdfStream(value, self.data[pos:pos + length])
+
+    def get(self, ref):
+        '''Returns the object of an indirect reference.'''
+
+        if ref.num not in self.objects:
+            location = self.offsets.get(ref.num)
+            if location is None:
+                # Missing objects are null.
+                return None
+            if isinstance(location, tuple):
+                self.objects[ref.num] = self.get_from_object_stream(
+                    *location)
+            else:
+                self.objects[ref.num] = self.parse_object_at(location)
+        return self.objects[ref.num]
+
+    def read_object_stream(self, num):
+        '''Returns a tuple of (decoded data, offset of the first object,
+        header) of an object stream. The header is a list of alternating
+        object numbers and their offsets, relative to the first object.'''
+
+        if num not in self.object_streams:
+            stream = self.get(PdfRef(num, 0))
+            data = self.decode_stream(stream)
+            first = stream.dict['First']
+            header = [int(n) for n in data[:first].split()]
+            self.object_streams[num] = data, first, header
+        return self.object_streams[num]
+
+    def get_from_object_stream(self, num, index):
+        '''Returns the index-th object inside an object stream.'''
+
+        data, first, header = self.read_object_stream(num)
+        return parse_pdf_value(data, first + header[2 * index + 1])[0]
+
+    def resolve(self, obj):
+        '''Returns the object itself, following indirect references.'''
+
+        while isinstance(obj, PdfRef):
+            obj = self.get(obj)
+        return obj
+
+    def decode_stream(self, stream):
+        '''Returns the decoded data of a stream that only uses FlateDecode.'''
+
+        data = stream.data
+        for name, parms in self.filters_of(stream):
+            if name not in ('FlateDecode', 'Fl'):
+                raise ValueError('Unsupported PDF filter: {0}'.format(name))
+            data = unpredict(zlib.decompress(data), parms)
+        return data
+
+    def filters_of(self, stream):
+        '''Returns a list of (filter name, decode parameters) tuples.'''
+
+        filters = self.resolve(stream.dict.get('Filter', []))
+        parms = self.resolve(stream.dict.get('DecodeParms'))
+        if not isinstance(filters, list):
+            filters = [filters]
+            parms = [parms]
+        if not isinstance(parms, list):
+            parms = [parms] * len(filters)
+        return [(self.resolve(name), self.resolve(parm) or {})
+                for name, parm in zip(filters, parms)]
+
+    def get_pages(self):
+        '''Returns the list of pages, as (page dictionary, resources) tuples.
+        '''
+
+        pages = []
+        root = self.resolve(self.resolve(self.trailer['Root'])['Pages'])
+        # Resources are inherited from the parent nodes.
+        pending = [(root, {})]
+        visited = set()
+        while pending:
+            node, resources = pending.pop()
+            if not isinstance(node, dict):
+                raise ValueError('Invalid PDF page tree')
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+            resources = self.resolve(node.get('Resources', resources))
+            if node.get('Type') == 'Page' or 'Kids' not in node:
+                pages.append((node, resources))
+            else:
+                kids = self.resolve(node['Kids'])
+                pending.extend((self.resolve(kid), resources)
+                               for kid in reversed(kids))
+        return pages
+
+    def iter_images(self, resources, visited=None):
+        '''Yields the image XObjects of the resources, including the ones
+        inside form XObjects.'''
+
+        visited = visited if visited is not None else set()
+        xobjects = self.resolve((resources or {}).get('XObject')) or {}
+        for ref in xobjects.values():
+            if isinstance(ref, PdfRef):
+                if ref in visited:
+                    continue
+                visited.add(ref)
+            stream = self.resolve(ref)
+            if not isinstance(stream, PdfStream):
+                continue
+            subtype = stream.dict.get('Subtype')
+            if subtype == 'Image':
+                yield stream
+            elif subtype == 'Form':
+                for image in self.iter_images(
+                        self.resolve(stream.dict.get('Resources')), visited):
+                    yield image
+
+    def page_image(self, page=1):
+        '''Returns the largest image of a page (counting from 1), as a PIL
+        image.'''
+
+        if not 1 <= page <= len(self.pages):
+            raise ValueError('The PDF has no page {0}'.format(page))
+        images = list(self.iter_images(self.pages[page - 1][1]))
+        if not images:
+            raise ValueError('Page {0} of the PDF has no images'.format(page))
+        return self.decode_image(max(images, key=lambda image: (
+            self.resolve(image.dict['Width']) *
+            self.resolve(image.dict['Height']))))
+
+    def image_mode(self, colorspace):
+        '''Returns the PIL mode for an image color space, and the palette
+        (as RGB bytes) for indexed color spaces.'''
+
+        colorspace = self.resolve(colorspace)
+        if isinstance(colorspace, list):
+            family = self.resolve(colorspace[0])
+            if family == 'ICCBased':
+                channels = self.resolve(colorspace[1]).dict['N']
+                return {1: 'L', 3: 'RGB', 4: 'CMYK'}[channels], None
+            if family in ('Indexed', 'I'):
+                base, _ = self.image_mode(colorspace[1])
+                lookup = self.resolve(colorspace[3])
+                if isinstance(lookup, PdfStream):
+                    lookup = self.decode_stream(lookup)
+                if base != 'RGB':
+                    lookup = Image.frombytes(
+                        base, (len(lookup) // len(base), 1),
+                        lookup).convert('RGB').tobytes()
+                return 'P', lookup
+            if family in ('CalRGB', 'CalGray'):
+                return {'CalRGB': 'RGB', 'CalGray': 'L'}[family], None
+            colorspace = family
+        modes = {
+            'DeviceGray': 'L', 'G': 'L',
+            'DeviceRGB': 'RGB', 'RGB': 'RGB',
+            'DeviceCMYK': 'CMYK', 'CMYK': 'CMYK',
+        }
+        if colorspace not in modes:
+            raise ValueError('Unsupported PDF color space: {0}'.format(
+                colorspace))
+        return modes[colorspace], None
+
+    def decode_image(self, stream):
+        '''Decodes an image XObject into a PIL image.'''
+
+        data = stream.data
+        for name, parms in self.filters_of(stream):
+            if name in ('DCTDecode', 'DCT', 'JPXDecode'):
+                # Pillow decodes JPEG (and JPEG 2000) by itself.
+                return Image.open(io.BytesIO(data))
+            if name not in ('FlateDecode', 'Fl'):
+                raise ValueError('Unsupported PDF filter: {0}'.format(name))
+            data = unpredict(zlib.decompress(data), parms)
+
+        width = self.resolve(stream.dict['Width'])
+        height = self.resolve(stream.dict['Height'])
+        bits = self.resolve(stream.dict.get('BitsPerComponent', 8))
+        if self.resolve(stream.dict.get('ImageMask')):
+            mode, palette, bits = '1', None, 1
+        else:
+            mode, palette = self.image_mode(stream.dict['ColorSpace'])
+        if bits == 16:
+            data = (numpy.frombuffer(data, dtype='>u2') >> 8).astype(
+                numpy.uint8).tobytes()
+        elif bits == 1 and mode in ('L', '1'):
+            mode = '1'
+        elif bits != 8:
+            raise ValueError('Unsupported PDF image with {0} bits'.format(
+                bits))
+
+        img = Image.frombytes(mode, (width, height), data)
+        if palette is not None:
+            img.putpalette(palette)
+        return img
+
+
+def open_picture(imgfile):
+    '''Opens a picture file (a file name or file object) as a PIL image. For
+    PDF files, this is the largest image of the first page.'''
+
+    if not hasattr(imgfile, 'read'):
+        with open(imgfile, 'rb') as f:
+            img = open_picture(f)
+            img.load()
+            return img
+    if is_pdf(imgfile):
+        return PdfReader(imgfile).page_image(1)
+    return Image.open(imgfile)
+
+
+def pixels_as_image(pixels):
+    '''Converts an array returned by preprocess_image() back to an RGB image.
+    '''
+
+    rgb = numpy.empty(pixels.shape + (3,), dtype=numpy.uint8)
+    for channel in range(3):
+        rgb[:, :, channel] = (pixels >> channel & 1) * 255
+    return Image.fromarray(rgb, 'RGB')
+
+
+def find_white_border(pixels):
+    '''Finds how large the white border is (for auto-cropping).
+
+    Receives the array returned by preprocess_image() and returns the number
+    of white lines at the top, bottom, left and right edges.
+    '''
+
+    def count_white_lines(non_white):
+        '''Returns how many leading entries of a boolean vector are False.'''
+        if non_white.any():
+            return int(numpy.argmax(non_white))
+        return len(non_white)
+
+    non_white = pixels != WHITE
+    # Reducing each row and each column to a single boolean.
+    non_white_rows = non_white.any(axis=1)
+    non_white_cols = non_white.any(axis=0)
+
+    top = count_white_lines(non_white_rows)
+    bottom = count_white_lines(non_white_rows[::-1])
+    left = count_white_lines(non_white_cols)
+    right = count_white_lines(non_white_cols[::-1])
+
+    return top, bottom, left, right
+
+
+def find_walls(pixels):
+    '''Analyzes pixel data and finds out the X,Y coordinates of the wall grid.
+
+    Receives the array returned by preprocess_image().
+
+    Returns two lists:
+    - a list of Y coordinates for horizontal walls
+    - a list of X coordinates for vertical walls
+    '''
+
+    height, width = pixels.shape
+
+    # Number of black pixels per each line and column (i.e. the projection
+    # profiles of the black pixels along each axis).
+    blacks = pixels == BLACK
+    blacks_per_line = blacks.sum(axis=1)
+    blacks_per_col = blacks.sum(axis=0)
+
+    # For the proposed input image, non-wall lines have at most 14% black
+    # pixels, while wall lines have at least 49%. Thus, the 33% threshold seems
+    # reasonable. Although this wall-detection code works fine for randomly
+    # generated mazes, it is still possible to craft a mazes that will break
+    # this logic.
+
+    threshold = width/3.0
+    wall_rows = numpy.flatnonzero(blacks_per_line > threshold).tolist()
+
+    threshold = height/3.0
+    wall_cols = numpy.flatnonzero(blacks_per_col > threshold).tolist()
+
+    return wall_rows, wall_cols
+
+
+# Bits used by Cell.exits_as_number() and by the arrays of packed cells.
+UP = 1 << 0
+DOWN = 1 << 1
+LEFT = 1 << 2
+RIGHT = 1 << 3
+SPECIAL = 1 << 4
+
+# Characters used for printing a cell, indexed by Cell.exits_as_number.
+CELL_CHARACTERS = u'░╵╷│╴┘┐┤╶└┌├─┴┬┼▓╹╻┃╸┛┓┫╺┗┏┣━┻┳╋'
+
+# The same characters, encoded as UTF-8. All of them take three bytes.
+CELL_CHARACTERS_UTF8 = numpy.frombuffer(
+    CELL_CHARACTERS.encode('utf8'), dtype=numpy.uint8).reshape(32, 3)
+
+# Number of exits for each value of Cell.exits_as_number.
+EXITS_PER_NUMBER = [bin(n).count('1') for n in range(32)]
+
+
+class Cell(object):
+    def __init__(self, up=True, down=True, left=True, right=True,
+                 special=False):
+        # True if we can move up/down/left/right.
+        # Up/down and left/right are redundant, since there are no one-way
+        # passages. However, adding them as attributes makes the code a bit
+        # more readable.
+        self.up = up
+        self.down = down
+        self.left = left
+        self.right = right
+        self.special = special
+
+    def __repr__(self):
+        return ('Cell({0.up}, {0.down}, {0.left}, {0.right}, '
+                '{0.special})').format(self)
+
+    def __unicode__(self):
+        return CELL_CHARACTERS[self.exits_as_number]
+
+    @property
+    def exits_as_number(self):
+        return (self.up << 0 | self.down << 1 | self.left << 2 |
+                self.right << 3 | self.special << 4)
+
+    @property
+    def exits(self):
+        '''Returns the number of exits from this cell.'''
+        return self.up + self.down + self.left + self.right + self.special
+
+    @exits.setter
+    def exits(self, value):
+        if value != 0:
+            raise NotImplementedError('You can only assign the value zero.')
+        self.up = False
+        self.down = False
+        self.left = False
+        self.right = False
+        self.special = False
+
+    @staticmethod
+    def maze_as_unicode(maze):
+        '''Receives a list of list of Cells (or a MazeGrid) and returns a
+        unicode string.'''
+        if isinstance(maze, MazeGrid):
+            return maze.as_unicode()
+        return u'\n'.join(
+            u''.join(CELL_CHARACTERS[cell.exits_as_number] for cell in line)
+            for line in maze)
+
+
+def sample_cells(pixels, wall_rows, wall_cols):
+    '''Reads all cells of the maze at once from the pixel array.
+
+    Returns a 2D numpy array of uint8, with one element per cell, using the
+    same encoding as Cell.exits_as_number.
+    '''
+
+    rows = numpy.asarray(wall_rows)
+    cols = numpy.asarray(wall_cols)
+    # Coordinates of the middle of each cell.
+    mid_rows = (rows[:-1] + rows[1:]) // 2
+    mid_cols = (cols[:-1] + cols[1:]) // 2
+
+    # Looking at the middle pixel of each wall. If it is black, there is a
+    # wall there.
+    cells = numpy.zeros((len(mid_rows), len(mid_cols)), dtype=numpy.uint8)
+    for bit, ys, xs in [
+            (UP, rows[:-1], mid_cols),
+            (DOWN, rows[1:], mid_cols),
+            (LEFT, mid_rows, cols[:-1]),
+            (RIGHT, mid_rows, cols[1:]),
+    ]:
+        cells[pixels[numpy.ix_(ys, xs)] != BLACK] |= bit
+
+    # Looking at the middle pixel of each cell. If it is neither white nor
+    # black, it is special.
+    middle = pixels[numpy.ix_(mid_rows, mid_cols)]
+    cells[(middle != BLACK) & (middle != WHITE)] |= SPECIAL
+
+    return cells
+
+
+class CellView(Cell):
+    '''A Cell that reads and writes its attributes from a MazeGrid.
+
+    Instances are created on demand by indexing a MazeGrid, and hold no state
+    of their own.
+    '''
+
+    def __init__(self, row, x):
+        self._row = row
+        self._x = x
+
+    def _bit_property(bit):
+        def getter(self):
+            return bool(self._row[self._x] & bit)
+
+        def setter(self, value):
+            if value:
+                self._row[self._x] |= bit
+            else:
+                self._row[self._x] &= ~bit & 0xFF
+        return property(getter, setter)
+
+    up = _bit_property(UP)
+    down = _bit_property(DOWN)
+    left = _bit_property(LEFT)
+    right = _bit_property(RIGHT)
+    special = _bit_property(SPECIAL)
+    del _bit_property
+
+    @property
+    def exits_as_number(self):
+        return int(self._row[self._x])
+
+
+class MazeGridRow(object):
+    '''A line of a MazeGrid, behaving like a list of Cells.'''
+
+    def __init__(self, row):
+        self._row = row
+
+    def __len__(self):
+        return len(self._row)
+
+    def __getitem__(self, x):
+        if not -len(self._row) <= x < len(self._row):
+            raise IndexError('MazeGridRow index out of range')
+        return CellView(self._row, x % len(self._row))
+
+    def __iter__(self):
+        for x in range(len(self._row)):
+            yield CellView(self._row, x)
+
+
+class MazeGrid(object):
+    '''A maze stored as a 2D numpy array of uint8, one byte per cell.
+
+    Each byte uses the same encoding as Cell.exits_as_number. Indexing a
+    MazeGrid as maze[y][x] gives a CellView, so code written for a list of
+    list of Cells also works on a MazeGrid, without storing one Python object
+    per cell.
+    '''
+
+    def __init__(self, cells):
+        self.cells = numpy.ascontiguousarray(cells, dtype=numpy.uint8)
+
+    @classmethod
+    def from_cells(cls, maze):
+        '''Builds a MazeGrid from a list of list of Cells.'''
+        return cls([[cell.exits_as_number for cell in line] for line in maze])
+
+    def to_cells(self):
+        '''Returns a list of list of Cells with the same contents.'''
+        return [
+            [Cell(bool(n & UP), bool(n & DOWN), bool(n & LEFT),
+                  bool(n & RIGHT), bool(n & SPECIAL)) for n in line]
+            for line in self.cells.tolist()]
+
+    def copy(self):
+        return MazeGrid(self.cells.copy())
+
+    @property
+    def width(self):
+        return self.cells.shape[1]
+
+    @property
+    def height(self):
+        return self.cells.shape[0]
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        return MazeGridRow(self.cells[y])
+
+    def __iter__(self):
+        for row in self.cells:
+            yield MazeGridRow(row)
+
+    def __repr__(self):
+        return 'MazeGrid({0!r})'.format(self.cells.tolist())
+
+    def up(self, x, y):
+        return bool(self.cells[y, x] & UP)
+
+    def down(self, x, y):
+        return bool(self.cells[y, x] & DOWN)
+
+    def left(self, x, y):
+        return bool(self.cells[y, x] & LEFT)
+
+    def right(self, x, y):
+        return bool(self.cells[y, x] & RIGHT)
+
+    def special(self, x, y):
+        return bool(self.cells[y, x] & SPECIAL)
+
+    def exits(self, x, y):
+        '''Returns the number of exits from the cell at x, y.'''
+        return EXITS_PER_NUMBER[self.cells[y, x]]
+
+    def exits_array(self):
+        '''Returns the number of exits from every cell, as an array.'''
+        return numpy.asarray(EXITS_PER_NUMBER, dtype=numpy.uint8)[self.cells]
+
+    def as_unicode(self):
+        '''Returns the same unicode string as Cell.maze_as_unicode().'''
+        return u'\n'.join(
+            u''.join([CELL_CHARACTERS[n] for n in line])
+            for line in self.cells.tolist())
+
+
+def print_maze(maze, output=None):
+    '''Prints a MazeGrid (or a list of list of Cells) as UTF-8.
+
+    See print_maze_rows().
+    '''
+
+    if not isinstance(maze, MazeGrid):
+        maze = MazeGrid.from_cells(maze)
+    print_maze_rows(maze.cells, output)
+
+
+def print_maze_rows(rows, output=None):
+    '''Prints rows of cells, each one a numpy array of uint8, as UTF-8.
+
+    Each row is translated to bytes through CELL_CHARACTERS_UTF8 and written
+    on its own, so the whole text of the maze is never held in memory.
+    Output defaults to the binary stream behind sys.stdout.
+    '''
+
+    if output is None:
+        # Anything already printed must come first.
+        sys.stdout.flush()
+        output = getattr(sys.stdout, 'buffer', sys.stdout)
+    for row in rows:
+        output.write(CELL_CHARACTERS_UTF8[row].tobytes())
+        output.write(b'\n')
+    output.flush()
+
+
+def build_maze_grid_from_image(pixels, walls=None):
+    '''Receives the array returned by preprocess_image() and returns a
+    MazeGrid.
+
+    If walls is given, it is what find_walls() returns for these pixels.
+    '''
+
+    wall_rows, wall_cols = walls or find_walls(pixels)
+    return MazeGrid(sample_cells(pixels, wall_rows, wall_cols))
+
+
+def iter_maze_rows_from_image(pixels, walls=None):
+    '''Generator form of build_maze_grid_from_image().
+
+    Yields each row of cells, as a numpy array of uint8, as soon as it has
+    been read from the pixels.
+    '''
+
+    wall_rows, wall_cols = walls or find_walls(pixels)
+    for j in range(len(wall_rows) - 1):
+        yield sample_cells(pixels, wall_rows[j:j + 2], wall_cols)[0]
+
+
+def draw_solution(pixels, maze, color=(0, 192, 0), walls=None):
+    '''Returns an RGB image of the pixels, with the solution painted with
+    the color.
+
+    Receives the array returned by preprocess_image() and the solved
+    MazeGrid. If walls is given, it is what find_walls() returns for these
+    pixels. The inside of every cell that still has a passage is painted,
+    and so are the open passages between them. All pixels are painted at
+    once, by mapping each pixel row and column to a cell or to a wall line.
+    '''
+
+    wall_rows, wall_cols = walls or find_walls(pixels)
+    height, width = maze.cells.shape
+
+    def line_of_each_pixel(walls, length):
+        '''Maps each pixel to 2 * j + 1 inside the j-th cell, to 2 * j on the
+        j-th wall line, and to -1 outside the grid.'''
+        cell = numpy.searchsorted(
+            walls, numpy.arange(length), side='right') - 1
+        line = 2 * cell + 1
+        line[walls] = numpy.arange(0, 2 * len(walls), 2)
+        line[(cell < 0) | (cell >= len(walls) - 1)] = -1
+        return line
+
+    # For each pair of the lines above, whether it is painted. The extra row
+    # and column are where the -1 indexes end up.
+    painted = numpy.zeros((2 * height + 2, 2 * width + 2), dtype=bool)
+    painted[1:-1:2, 1:-1:2] = maze.cells & (UP | DOWN | LEFT | RIGHT) != 0
+    painted[2:-2:2, 1:-1:2] = maze.cells[1:] & UP != 0
+    painted[1:-1:2, 2:-2:2] = maze.cells[:, 1:] & LEFT != 0
+
+    mask = painted[numpy.ix_(line_of_each_pixel(wall_rows, pixels.shape[0]),
+                             line_of_each_pixel(wall_cols, pixels.shape[1]))]
+
+    # The solution is drawn as a ninth color of the palette of the pixels,
+    # so the RGB image is only written once, by PIL.
+    img = Image.fromarray(numpy.where(mask, numpy.uint8(8), pixels), 'P')
+    palette = [(value >> channel & 1) * 255
+               for value in range(8) for channel in range(3)]
+    img.putpalette(palette + list(color))
+    return img.convert('RGB')
+
+
+def build_maze_from_image(pixels):
+    '''Receives the array returned by preprocess_image() and returns a list of
+    list of Cells.'''
+
+    return build_maze_grid_from_image(pixels).to_cells()
+
+
+class WavePrinter(object):
+    '''Prints the maze during the passages of the dead-end solvers.
+
+    Used by the solvers when their verboseness is 2. The mode can be:
+    full:  the whole maze is printed after each passage.
+    delta: only the cells changed since the previous print are printed, one
+           per line, as "x y character".
+    ansi:  the maze is printed once, and then the changed cells are redrawn
+           in place using ANSI escape sequences. The whole maze must fit in
+           the terminal.
+
+    If every is larger than 1, only one of every so many passages is printed,
+    and the final state of the maze is always printed at the end.
+    '''
+
+    MODES = ['full', 'delta', 'ansi']
+
+    def __init__(self, mode='full', every=1, output=None):
+        self.mode = mode
+        self.every = every
+        self.output = output
+
+    def start(self, maze):
+        '''Must be called before the first passage.'''
+        self.previous = self.cells_of(maze).copy()
+        self.count = 0
+        self.pending = None
+        if self.mode == 'ansi':
+            print_maze_rows(self.previous, self.get_output())
+
+    def __call__(self, maze, num_dead_ends):
+        '''Must be called after each passage that should be printed.'''
+        self.count += 1
+        if (self.count - 1) % self.every:
+            self.pending = num_dead_ends
+        else:
+            self.pending = None
+            self.show(maze, num_dead_ends)
+
+    def wants_next(self):
+        '''Returns True if the next call will print the maze. Solvers that
+        keep the maze in another form only need to store it back for these
+        passages.'''
+        return self.count % self.every == 0
+
+    def finish(self, maze):
+        '''Must be called after the last passage.'''
+        if self.pending is not None:
+            self.show(maze, self.pending)
+        if self.mode == 'ansi':
+            self.get_output().write(b'\n')
+            self.get_output().flush()
+
+    def get_output(self):
+        if self.output is not None:
+            return self.output
+        # Anything already printed must come first.
+        sys.stdout.flush()
+        return getattr(sys.stdout, 'buffer', sys.stdout)
+
+    @staticmethod
+    def cells_of(maze):
+        if not isinstance(maze, MazeGrid):
+            maze = MazeGrid.from_cells(maze)
+        return maze.cells
+
+    def show(self, maze, num_dead_ends):
+        message = 'Cutting {0} dead-ends.'.format(num_dead_ends)
+        cells = self.cells_of(maze)
+        output = self.get_output()
+
+        if self.mode == 'full':
+            output.write(message.encode('utf8') + b'\n')
+            print_maze_rows(cells, output)
+            return
+
+        height = cells.shape[0]
+        changed_y, changed_x = numpy.nonzero(cells != self.previous)
+        characters = CELL_CHARACTERS_UTF8[cells[changed_y, changed_x]]
+        if self.mode == 'delta':
+            output.write(message.encode('utf8') + b'\n')
+            for x, y, character in zip(changed_x.tolist(), changed_y.tolist(),
+                                       characters):
+                output.write('{0} {1} '.format(x, y).encode('ascii'))
+                output.write(character.tobytes() + b'\n')
+        else:
+            # The cursor is at the line just below the maze.
+            for x, y, character in zip(changed_x.tolist(), changed_y.tolist(),
+                                       characters):
+                output.write('\r\x1b[{0}A\x1b[{1}G'.format(
+                    height - y, x + 1).encode('ascii'))
+                output.write(character.tobytes())
+                output.write('\r\x1b[{0}B'.format(height - y).encode('ascii'))
+            output.write(b'\r\x1b[K' + message.encode('utf8'))
+        output.flush()
+        self.previous = cells.copy()
+
+
+def cut_dead_ends(maze, verboseness=0, wave_printer=None):
+    '''Receives a list of list of Cells (or a MazeGrid), find dead-ends and
+    remove them.
+
+    Verboseness can be:
+    0: Nothing is printed.
+    1: The number of dead-ends found on each passage is printed.
+    2: The number of dead-ends and the maze are printed, by wave_printer (a
+       WavePrinter, which defaults to printing the full maze).
+
+    Returns the number of dead-ends found on each passage.
+    '''
+
+    height = len(maze)
+    width = len(maze[0])
+
+    # List of (x, y) coordinates for each dead-end.
+    dead_ends = []
+    for i in range(width):
+        for j in range(height):
+            if maze[j][i].exits == 1:
+                dead_ends.append((i, j))
+
+    num_dead_ends_over_time = []
+    if verboseness == 2:
+        wave_printer = wave_printer or WavePrinter()
+        wave_printer.start(maze)
+
+    while dead_ends:
+        old_dead_ends = dead_ends
+        dead_ends = []
+
+        for x, y in old_dead_ends:
+            cell = maze[y][x]
+            directions = [
+                ('up', 'down', 0, -1),
+                ('down', 'up', 0, +1),
+                ('left', 'right', -1, 0),
+                ('right', 'left', +1, 0),
+            ]
+            for dir, revdir, xdelta, ydelta in directions:
+                if getattr(cell, dir):
+                    setattr(cell, dir, False)
+                    x2 = x + xdelta
+                    y2 = y + ydelta
+                    if 0 <= x2 < width and 0 <= y2 < height:
+                        other_cell = maze[y2][x2]
+                        setattr(other_cell, revdir, False)
+                        if other_cell.exits == 1:
+                            dead_ends.append((x2, y2))
+
+        num_dead_ends_over_time.append(len(old_dead_ends))
+
+        if verboseness == 2 and len(old_dead_ends) != len(dead_ends):
+            wave_printer(maze, len(old_dead_ends))
+
+    if verboseness == 2:
+        wave_printer.finish(maze)
+    if verboseness == 1 and num_dead_ends_over_time:
+        print('Cutting dead-ends: {0}'.format(
+            ', '.join(str(n) for n in num_dead_ends_over_time)))
+
+    return num_dead_ends_over_time
+
+
+def flatten_maze(grid):
+    '''Prepares a MazeGrid for solvers that visit one cell at a time.
+
+    Returns a tuple of:
+    - a flat bytearray copy of grid.cells, indexed by y * width + x
+    - a bytearray with the directions that lead to another cell (instead of
+      leaving the maze) from each index
+    - a list of (direction, reverse direction, index delta) tuples
+    '''
+
+    height, width = grid.cells.shape
+
+    cells = bytearray(grid.cells.tobytes())
+
+    inside = numpy.full((height, width), UP | DOWN | LEFT | RIGHT,
+                        dtype=numpy.uint8)
+    inside[0, :] &= ~UP & 0xFF
+    inside[-1, :] &= ~DOWN & 0xFF
+    inside[:, 0] &= ~LEFT & 0xFF
+    inside[:, -1] &= ~RIGHT & 0xFF
+    inside = bytearray(inside.tobytes())
+
+    directions = [
+        (UP, DOWN, -width),
+        (DOWN, UP, +width),
+        (LEFT, RIGHT, -1),
+        (RIGHT, LEFT, +1),
+    ]
+
+    return cells, inside, directions
+
+
+def mark_path(grid, path):
+    '''Removes all passages from a MazeGrid, except the ones along the path.
+
+    The path is a list of flat indexes (y * width + x) of adjacent cells. The
+    special attribute of the cells is kept.
+
+    Returns the path as a list of (x, y) coordinates.
+    '''
+
+    height, width = grid.cells.shape
+    cells = grid.cells.reshape(-1)
+    cells &= SPECIAL
+
+    directions_by_delta = {
+        -width: (UP, DOWN),
+        +width: (DOWN, UP),
+        -1: (LEFT, RIGHT),
+        +1: (RIGHT, LEFT),
+    }
+    for index, other in zip(path, path[1:]):
+        dir, revdir = directions_by_delta[other - index]
+        cells[index] |= dir
+        cells[other] |= revdir
+
+    return [(index % width, index // width) for index in path]
+
+
+def follow_parents(parent, end):
+    '''Returns the list of indexes from the start of a search to end, given
+    the parent of each index. The start is the index that is its own parent.
+    '''
+
+    path = [end]
+    while parent[end] != end:
+        end = parent[end]
+        path.append(end)
+    path.reverse()
+    return path
+
+
+def fill_dead_ends(grid, verboseness=0, wave_printer=None):
+    '''Same as cut_dead_ends(), but faster, and only for a MazeGrid.
+
+    Keeps the number of exits of each cell in an array, and the dead-ends in
+    a single queue. Each removed cell costs a constant amount of work, and
+    the whole maze is scanned only once, at the beginning.
+
+    Returns the number of dead-ends found on each passage.
+    '''
+
+    cells, inside, directions = flatten_maze(grid)
+    degree = bytearray(grid.exits_array().tobytes())
+
+    dead_ends = collections.deque(
+        numpy.flatnonzero(grid.exits_array() == 1).tolist())
+    num_dead_ends_over_time = []
+    if verboseness == 2:
+        wave_printer = wave_printer or WavePrinter()
+        wave_printer.start(grid)
+
+    while dead_ends:
+        num_dead_ends = len(dead_ends)
+        num_dead_ends_over_time.append(num_dead_ends)
+
+        for _ in range(num_dead_ends):
+            index = dead_ends.popleft()
+            exits = cells[index] & inside[index]
+            cells[index] &= SPECIAL
+            for dir, revdir, delta in directions:
+                if exits & dir:
+                    other = index + delta
+                    if cells[other] & revdir:
+                        cells[other] ^= revdir
+                        degree[other] -= 1
+                        if degree[other] == 1:
+                            dead_ends.append(other)
+
+        if verboseness == 2 and num_dead_ends != len(dead_ends):
+            if wave_printer.wants_next():
+                grid.cells.flat[:] = numpy.frombuffer(cells, dtype=numpy.uint8)
+            wave_printer(grid, num_dead_ends)
+
+    grid.cells.flat[:] = numpy.frombuffer(cells, dtype=numpy.uint8)
+    if verboseness == 2:
+        wave_printer.finish(grid)
+
+    if verboseness == 1 and num_dead_ends_over_time:
+        print('Cutting dead-ends: {0}'.format(
+            ', '.join(str(n) for n in num_dead_ends_over_time)))
+
+    return num_dead_ends_over_time
+
+
+def fill_dead_ends_wavefront(grid, verboseness=0, wave_printer=None):
+    '''Same as cut_dead_ends(), but vectorized, and only for a MazeGrid.
+
+    The passages are kept in two boolean arrays, one for the horizontal wall
+    lines and another for the vertical ones, and the number of exits of each
+    cell in a third one. On each passage, all the passages of the current
+    dead-ends are closed at once by fancy indexing, and only the exits of
+    their neighbors are updated. Thus, the work done in Python is per
+    passage, not per cell, and each passage only costs as much as its
+    number of dead-ends.
+
+    Returns the number of dead-ends found on each passage.
+    '''
+
+    cells = grid.cells
+    height, width = cells.shape
+
+    # vertical[j, i] is True if one can cross the j-th horizontal wall line
+    # at the i-th column. Likewise for horizontal[j, i] and the i-th vertical
+    # wall line at the j-th row. Both neighbors of a passage share the same
+    # element, so closing it once closes it for both.
+    vertical = numpy.zeros((height + 1, width), dtype=bool)
+    vertical[:-1] = cells & UP != 0
+    vertical[-1] = cells[-1] & DOWN != 0
+    horizontal = numpy.zeros((height, width + 1), dtype=bool)
+    horizontal[:, :-1] = cells & LEFT != 0
+    horizontal[:, -1] = cells[:, -1] & RIGHT != 0
+    special = cells & SPECIAL != 0
+
+    def store():
+        cells[...] = special * numpy.uint8(SPECIAL)
+        cells[vertical[:-1]] |= UP
+        cells[vertical[1:]] |= DOWN
+        cells[horizontal[:, :-1]] |= LEFT
+        cells[horizontal[:, 1:]] |= RIGHT
+
+    exits = special.astype(numpy.uint8)
+    exits += vertical[:-1]
+    exits += vertical[1:]
+    exits += horizontal[:, :-1]
+    exits += horizontal[:, 1:]
+
+    # Flat views, indexed by j * width + i for the cells and vertical, and
+    # by j * (width + 1) + i for horizontal.
+    exits = exits.reshape(-1)
+    special_flat = special.reshape(-1)
+    vertical_flat = vertical.reshape(-1)
+    horizontal_flat = horizontal.reshape(-1)
+
+    # This is the number of dead-ends that cut_dead_ends() would visit on
+    # each passage, even if some of them have no exit left by then.
+    num_dead_ends = int(numpy.count_nonzero(exits == 1))
+    dead_ends = numpy.flatnonzero((exits == 1) & ~special_flat)
+    num_dead_ends_over_time = []
+    if verboseness == 2:
+        wave_printer = wave_printer or WavePrinter()
+        wave_printer.start(grid)
+
+    while num_dead_ends:
+        num_dead_ends_over_time.append(num_dead_ends)
+
+        # The open passages of the dead-ends. Two neighboring dead-ends share
+        # the passage between them, which must only be closed once.
+        rows = dead_ends // width
+        up = dead_ends[vertical_flat[dead_ends]]
+        down = dead_ends[vertical_flat[dead_ends + width]] + width
+        left = dead_ends[horizontal_flat[dead_ends + rows]]
+        left += left // width
+        right = dead_ends[horizontal_flat[dead_ends + rows + 1]]
+        right += right // width + 1
+        vertical_passages = numpy.unique(numpy.concatenate([up, down]))
+        horizontal_passages = numpy.unique(numpy.concatenate([left, right]))
+        vertical_flat[vertical_passages] = False
+        horizontal_flat[horizontal_passages] = False
+
+        # Both cells on each side of the closed passages lose an exit, except
+        # outside of the maze.
+        above = vertical_passages - width
+        below = vertical_passages
+        columns = horizontal_passages % (width + 1)
+        rows = horizontal_passages // (width + 1)
+        on_left = horizontal_passages - rows - 1
+        on_right = horizontal_passages - rows
+        neighbors, lost_exits = numpy.unique(numpy.concatenate([
+            above[above >= 0], below[below < width * height],
+            on_left[columns > 0], on_right[columns < width],
+        ]), return_counts=True)
+
+        old_exits = exits[neighbors]
+        new_exits = old_exits - lost_exits.astype(numpy.uint8)
+        exits[neighbors] = new_exits
+        old_num_dead_ends = num_dead_ends
+        num_dead_ends = int(numpy.count_nonzero(
+            (old_exits >= 2) & (new_exits <= 1)))
+        dead_ends = neighbors[(new_exits == 1) & ~special_flat[neighbors]]
+
+        if verboseness == 2 and old_num_dead_ends != num_dead_ends:
+            if wave_printer.wants_next():
+                store()
+            wave_printer(grid, old_num_dead_ends)
+
+    store()
+    if verboseness == 2:
+        wave_printer.finish(grid)
+
+    if verboseness == 1 and num_dead_ends_over_time:
+        print('Cutting dead-ends: {0}'.format(
+            ', '.join(str(n) for n in num_dead_ends_over_time)))
+
+    return num_dead_ends_over_time
+
+
+def find_shortest_path(grid, verboseness=0):
+    '''Solves a MazeGrid using a breadth-first search.
+
+    The search starts at the first special cell and stops at the nearest
+    other special cell. Only the shortest path between them is kept in the
+    maze; unlike the dead-end solvers, cycles are removed as well. If there
+    is no such path, all passages are removed.
+
+    If verboseness is 1 or more, the path length and the number of expanded
+    cells are printed.
+
+    Returns the path as a list of (x, y) coordinates.
+    '''
+
+    cells, inside, directions = flatten_maze(grid)
+    specials = numpy.flatnonzero(grid.cells & SPECIAL).tolist()
+
+    path = []
+    visited = 0
+    if len(specials) >= 2:
+        start = specials[0]
+        # The parent of each visited cell, or -1 for cells not yet visited.
+        parent = array.array('l', [-1]) * len(cells)
+        parent[start] = start
+        queue = collections.deque([start])
+
+        while queue:
+            index = queue.popleft()
+            visited += 1
+            if cells[index] & SPECIAL and index != start:
+                path = follow_parents(parent, index)
+                break
+
+            exits = cells[index] & inside[index]
+            for dir, revdir, delta in directions:
+                if exits & dir:
+                    other = index + delta
+                    if parent[other] == -1:
+                        parent[other] = index
+                        queue.append(other)
+
+    if verboseness >= 1:
+        print('Shortest path: {0} cells, {1} cells expanded.'.format(
+            len(path), visited))
+
+    return mark_path(grid, path)
+
+
+def find_shortest_path_astar(grid, verboseness=0):
+    '''Solves a MazeGrid using the A* search algorithm.
+
+    Same as find_shortest_path(), but the cells are expanded in order of their
+    distance from the start plus their Manhattan distance to the nearest other
+    special cell. On open mazes, far fewer cells are expanded.
+    '''
+
+    height, width = grid.cells.shape
+    cells, inside, directions = flatten_maze(grid)
+    specials = numpy.flatnonzero(grid.cells & SPECIAL).tolist()
+
+    path = []
+    expanded = 0
+    if len(specials) >= 2:
+        start = specials[0]
+        goals = [divmod(index, width) for index in specials[1:]]
+
+        if len(goals) == 1:
+            # The usual case, worth avoiding the min() below.
+            [(goal_y, goal_x)] = goals
+
+            def heuristic(index):
+                y, x = divmod(index, width)
+                return abs(x - goal_x) + abs(y - goal_y)
+        else:
+            def heuristic(index):
+                y, x = divmod(index, width)
+                return min(abs(x - gx) + abs(y - gy) for gy, gx in goals)
+
+        # The parent of each reached cell, or -1 for cells not yet reached.
+        parent = array.array('l', [-1]) * len(cells)
+        parent[start] = start
+        # The distance from the start to each reached cell.
+        distance = array.array('l', [0]) * len(cells)
+        closed = bytearray(len(cells))
+        # Entries are (estimated total distance, -distance, index). Among
+        # equal estimates, the cells farthest from the start come first, as
+        # they are the nearest to the goal; otherwise, open areas are
+        # expanded almost as widely as by find_shortest_path().
+        heap = [(heuristic(start), 0, start)]
+
+        while heap:
+            _, dist, index = heapq.heappop(heap)
+            dist = -dist
+            if closed[index]:
+                continue
+            closed[index] = 1
+            expanded += 1
+            if cells[index] & SPECIAL and index != start:
+                path = follow_parents(parent, index)
+                break
+
+            exits = cells[index] & inside[index]
+            for dir, revdir, delta in directions:
+                if exits & dir:
+                    other = index + delta
+                    if closed[other]:
+                        continue
+                    if parent[other] == -1 or dist + 1 < distance[other]:
+                        parent[other] = index
+                        distance[other] = dist + 1
+                        heapq.heappush(
+                            heap, (dist + 1 + heuristic(other), -dist - 1,
+                                   other))
+
+    if verboseness >= 1:
+        print('Shortest path: {0} cells, {1} cells expanded.'.format(
+            len(path), expanded))
+
+    return mark_path(grid, path)
+
+
+def find_shortest_path_bidirectional(grid, verboseness=0):
+    '''Solves a MazeGrid using a bidirectional breadth-first search.
+
+    Same as find_shortest_path(), but one search starts at the first special
+    cell and another one starts at all the other special cells. On each step,
+    the smaller frontier is expanded by one whole level, until both searches
+    meet. When the special cells are far apart, roughly half as many cells
+    are expanded.
+    '''
+
+    cells, inside, directions = flatten_maze(grid)
+    specials = numpy.flatnonzero(grid.cells & SPECIAL).tolist()
+
+    path = []
+    expanded = 0
+    if len(specials) >= 2:
+        # Which search reached each cell: 0 for none, or the key of the
+        # frontiers dictionary.
+        reached_by = bytearray(len(cells))
+        # The parent of each reached cell (the start cells are their own
+        # parents), and the distance from the start of its search.
+        parent = array.array('l', [-1]) * len(cells)
+        distance = array.array('l', [0]) * len(cells)
+        frontiers = {1: specials[:1], 2: specials[1:]}
+        for search, frontier in frontiers.items():
+            for index in frontier:
+                reached_by[index] = search
+                parent[index] = index
+
+        # Tuple of (length, index from search 1, index from search 2).
+        best = None
+        while frontiers[1] and frontiers[2] and best is None:
+            search = 1 if len(frontiers[1]) <= len(frontiers[2]) else 2
+            new_frontier = []
+            for index in frontiers[search]:
+                expanded += 1
+                exits = cells[index] & inside[index]
+                for dir, revdir, delta in directions:
+                    if exits & dir:
+                        other = index + delta
+                        if reached_by[other] == 0:
+                            reached_by[other] = search
+                            parent[other] = index
+                            distance[other] = distance[index] + 1
+                            new_frontier.append(other)
+                        elif reached_by[other] != search:
+                            length = distance[index] + distance[other] + 1
+                            if best is None or length < best[0]:
+                                if search == 1:
+                                    best = (length, index, other)
+                                else:
+                                    best = (length, other, index)
+            frontiers[search] = new_frontier
+
+        if best is not None:
+            _, meeting1, meeting2 = best
+            path = follow_parents(parent, meeting1)
+            path.extend(reversed(follow_parents(parent, meeting2)))
+
+    if verboseness >= 1:
+        print('Shortest path: {0} cells, {1} cells expanded.'.format(
+            len(path), expanded))
+
+    return mark_path(grid, path)
+
+
+def count_components(size, edges):
+    '''Returns the number of connected components of a graph, using a
+    union-find.
+
+    Args:
+    size  -- number of vertices, numbered from zero
+    edges -- iterable of (vertex, vertex) tuples
+    '''
+
+    parent = array.array('l', range(size))
+    components = size
+    for a, b in edges:
+        # Finding the roots, halving the paths along the way.
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        while parent[b] != b:
+            parent[b] = parent[parent[b]]
+            b = parent[b]
+        if a != b:
+            parent[a] = b
+            components -= 1
+    return components
+
+
+def count_cycles(grid):
+    '''Returns the number of independent cycles in a MazeGrid.
+
+    The cells are the vertices of a graph, and the passages between them are
+    its edges. The connected components are counted by count_components(),
+    and the number of independent cycles is then E - V + C. Passages leaving
+    the maze are ignored. The MazeGrid is not modified.
+    '''
+
+    height, width = grid.cells.shape
+    size = height * width
+
+    # Every passage appears in two cells, so only the passages going down and
+    # right are looked at.
+    going_down = numpy.zeros((height, width), dtype=bool)
+    going_down[:-1, :] = grid.cells[:-1, :] & DOWN != 0
+    going_right = numpy.zeros((height, width), dtype=bool)
+    going_right[:, :-1] = grid.cells[:, :-1] & RIGHT != 0
+    down = numpy.flatnonzero(going_down)
+    right = numpy.flatnonzero(going_right)
+    del going_down, going_right
+
+    # The edges are generated lazily, a chunk at a time, as a list of tuples
+    # would take several times the memory of the maze.
+    def pairs(first, delta, chunk_size=65536):
+        return itertools.chain.from_iterable(
+            zip(first[start:start + chunk_size].tolist(),
+                (first[start:start + chunk_size] + delta).tolist())
+            for start in range(0, len(first), chunk_size))
+
+    edges = itertools.chain(pairs(down, width), pairs(right, 1))
+
+    components = count_components(size, edges)
+
+    return len(down) + len(right) - size + components
+
+
+class JunctionGraph(object):
+    '''A maze contracted into a graph of junctions connected by corridors.
+
+    Cells with exactly two passages to other cells are corridor cells, and
+    chains of them are merged into a single weighted edge. All other cells
+    (junctions, dead-ends, isolated cells) and all special cells become
+    nodes. Passages leaving the maze are ignored.
+
+    The adjacency is stored in CSR form: the edges leaving the i-th node are
+    the entries from indptr[i] to indptr[i + 1] of the arrays below. Every
+    edge is stored twice, once for each of its ends.
+
+    Attributes:
+    width       -- width of the maze, in cells
+    nodes       -- flat index (y * width + x) of the cell of each node
+    indptr      -- start of the edges of each node, plus the total at the end
+    targets     -- node at the other end of each edge
+    lengths     -- number of steps (i.e. passages) along each edge
+    first_steps -- flat index delta of the first step along each edge
+    num_loops   -- number of closed corridors that touch no node at all
+    '''
+
+    def __init__(self, width, nodes, indptr, targets, lengths, first_steps,
+                 num_loops):
+        self.width = width
+        self.nodes = nodes
+        self.indptr = indptr
+        self.targets = targets
+        self.lengths = lengths
+        self.first_steps = first_steps
+        self.num_loops = num_loops
+
+    @classmethod
+    def from_grid(cls, grid):
+        '''Builds a JunctionGraph from a MazeGrid, in O(cells log cells) time
+        but with numpy operations only, except for closed loops.
+
+        The corridors are followed by pointer jumping. There is a state for
+        each cell and direction, meaning "arrived at this cell moving in this
+        direction". A state of a corridor cell leads to the state of the next
+        cell, one step away, and a state of a node leads to itself, zero
+        steps away. On each round, every state is replaced by the one its
+        next state leads to, adding up their steps, so after k rounds the
+        states are 2 ** k steps ahead, or at the node ending their corridor.
+        '''
+
+        height, width = grid.cells.shape
+        size = height * width
+        cells, inside, directions = flatten_maze(grid)
+
+        passages = grid.cells.reshape(-1) & numpy.frombuffer(
+            inside, dtype=numpy.uint8)
+        exits = numpy.asarray(EXITS_PER_NUMBER, dtype=numpy.uint8)[passages]
+        node_mask = (exits != 2) | (grid.cells.reshape(-1) & SPECIAL != 0)
+        nodes = numpy.flatnonzero(node_mask)
+        node_ids = numpy.full(size, -1, dtype=numpy.int64)
+        node_ids[nodes] = numpy.arange(len(nodes))
+
+        # Half the memory is faster, and enough for most mazes.
+        dtype = numpy.int32 if 4 * size < 2 ** 31 else numpy.int64
+        deltas = numpy.array([delta for _, _, delta in directions],
+                             dtype=dtype)
+        # The direction (its position in directions) of each single bit.
+        direction_of = numpy.zeros(RIGHT + 1, dtype=dtype)
+        for i, (dir, revdir, delta) in enumerate(directions):
+            direction_of[dir] = i
+
+        # State 4 * index + i: arrived at the cell index moving in the i-th
+        # direction, i.e. through its reverse passage.
+        following = numpy.arange(4 * size, dtype=dtype)
+        steps = numpy.zeros(4 * size, dtype=dtype)
+        corridor = numpy.flatnonzero(~node_mask).astype(dtype)
+        corridor_passages = passages[corridor]
+        active = []
+        for i, (dir, revdir, delta) in enumerate(directions):
+            entered = corridor_passages & revdir != 0
+            out = direction_of[corridor_passages[entered] ^ revdir]
+            entered = corridor[entered]
+            states = entered * 4 + i
+            targets = (entered + deltas[out]) * 4 + out
+            following[states] = targets
+            steps[states] = 1
+            active.append(states[~node_mask[targets >> 2]])
+        active = numpy.concatenate(active)
+        del corridor, corridor_passages, entered, out, states, targets
+
+        # States that reach a node are done. Their corridor has states at
+        # every distance from the node, so if a round finishes none of them,
+        # the remaining ones are on closed loops and never will.
+        while len(active):
+            ahead = following[active]
+            steps[active] += steps[ahead]
+            ahead = following[ahead]
+            following[active] = ahead
+            remaining = active[~node_mask[ahead >> 2]]
+            if len(remaining) == len(active):
+                break
+            active = remaining
+
+        # The edges, in order of their node and then of their direction.
+        has_edge = (passages[nodes, numpy.newaxis] &
+                    numpy.array([dir for dir, _, _ in directions],
+                                dtype=numpy.uint8)) != 0
+        edge_nodes, edge_directions = numpy.nonzero(has_edge)
+        indptr = numpy.zeros(len(nodes) + 1, dtype=numpy.int64)
+        numpy.cumsum(has_edge.sum(axis=1), out=indptr[1:])
+        first_steps = deltas[edge_directions].astype(numpy.int64)
+        starts = (nodes[edge_nodes] + first_steps) * 4 + edge_directions
+        targets = node_ids[following[starts] >> 2]
+        lengths = steps[starts] + numpy.int64(1)
+        del following, steps, has_edge
+
+        # Each closed loop is walked once, marking its cells. They are rare.
+        num_loops = 0
+        visited = set()
+        for index in numpy.unique(active // 4).tolist():
+            if index in visited:
+                continue
+            num_loops += 1
+            previous = None
+            while index not in visited:
+                visited.add(index)
+                for dir, revdir, delta in directions:
+                    if (cells[index] & inside[index] & dir and
+                            index + delta != previous):
+                        break
+                previous = index
+                index += delta
+
+        return cls(width, nodes, indptr, targets, lengths, first_steps,
+                   num_loops)
+
+    @property
+    def num_edges(self):
+        return len(self.targets) // 2
+
+    def count_cycles(self):
+        '''Same as count_cycles(), but computed on the contracted graph.'''
+        # Each edge is only needed once, from its lowest node.
+        sources = numpy.repeat(numpy.arange(len(self.nodes)),
+                               numpy.diff(self.indptr))
+        lowest = sources < self.targets
+        edges = zip(sources[lowest].tolist(), self.targets[lowest].tolist())
+        components = count_components(len(self.nodes), edges)
+        return (self.num_edges - len(self.nodes) + components +
+                self.num_loops)
+
+    def expand_path(self, grid, edges):
+        '''Converts a path in the graph back into cells of the maze.
+
+        Receives the MazeGrid used for building this graph and a list of
+        (node, edge) tuples, each edge leaving its node. Returns the flat
+        indexes of all the cells along the path.
+        '''
+
+        cells, inside, directions = flatten_maze(grid)
+        path = []
+        for node, edge in edges:
+            index = int(self.nodes[node])
+            delta = int(self.first_steps[edge])
+            path.append(index)
+            for _ in range(int(self.lengths[edge]) - 1):
+                index += delta
+                path.append(index)
+                passages = cells[index] & inside[index]
+                for dir, revdir, next_delta in directions:
+                    if passages & dir and next_delta != -delta:
+                        delta = next_delta
+                        break
+            index += delta
+        if edges:
+            path.append(index)
+        return path
+
+
+def find_shortest_path_junctions(grid, verboseness=0, graph=None):
+    '''Solves a MazeGrid using Dijkstra's algorithm on its JunctionGraph.
+
+    Same result as find_shortest_path(), but the search runs on the
+    contracted graph, and only the cells along the path are visited again
+    when the path is expanded. The graph can also be reused for
+    JunctionGraph.count_cycles(). If graph is given, it must have been built
+    from this MazeGrid, before solving it.
+    '''
+
+    if graph is None:
+        graph = JunctionGraph.from_grid(grid)
+    indptr = graph.indptr.tolist()
+    targets = graph.targets.tolist()
+    lengths = graph.lengths.tolist()
+    num_nodes = len(graph.nodes)
+    specials = numpy.flatnonzero(
+        grid.cells.reshape(-1)[graph.nodes] & SPECIAL).tolist()
+
+    path = []
+    expanded = 0
+    if len(specials) >= 2:
+        start = specials[0]
+        is_goal = bytearray(num_nodes)
+        for node in specials[1:]:
+            is_goal[node] = 1
+        # The node and edge each reached node was reached through, or -1 for
+        # nodes not yet reached.
+        parent = array.array('l', [-1]) * num_nodes
+        parent_edge = array.array('l', [-1]) * num_nodes
+        distance = array.array('l', [0]) * num_nodes
+        closed = bytearray(num_nodes)
+        # The lengths are small integers, so instead of a heap, the nodes
+        # are kept in a list per distance (Dial's algorithm).
+        buckets = [[start]]
+        goal = None
+        dist = 0
+
+        while goal is None and dist < len(buckets):
+            for node in buckets[dist]:
+                if closed[node]:
+                    continue
+                closed[node] = 1
+                expanded += 1
+                if is_goal[node]:
+                    goal = node
+                    break
+
+                for edge in range(indptr[node], indptr[node + 1]):
+                    other = targets[edge]
+                    if closed[other]:
+                        continue
+                    new_dist = dist + lengths[edge]
+                    if parent[other] == -1 or new_dist < distance[other]:
+                        distance[other] = new_dist
+                        parent[other] = node
+                        parent_edge[other] = edge
+                        while len(buckets) <= new_dist:
+                            buckets.append([])
+                        buckets[new_dist].append(other)
+            buckets[dist] = None
+            dist += 1
+
+        if goal is not None:
+            edges = []
+            node = goal
+            while node != start:
+                node, edge = parent[node], parent_edge[node]
+                edges.append((node, edge))
+            edges.reverse()
+            path = graph.expand_path(grid, edges)
+
+    if verboseness >= 1:
+        print('Junction graph: {0} nodes, {1} edges.'.format(
+            len(graph.nodes), graph.num_edges))
+        print('Shortest path: {0} cells, {1} nodes expanded.'.format(
+            len(path), expanded))
+
+    return mark_path(grid, path)
+
+
+# Functions that solve a MazeGrid in place, by name.
+SOLVERS = {
+    'reference': cut_dead_ends,
+    'queue': fill_dead_ends,
+    'wavefront': fill_dead_ends_wavefront,
+    'bfs': find_shortest_path,
+    'astar': find_shortest_path_astar,
+    'bidirectional': find_shortest_path_bidirectional,
+    'junctions': find_shortest_path_junctions,
+}
+
+# Solvers that accept a WavePrinter.
+DEAD_END_SOLVERS = ['reference', 'queue', 'wavefront']
+
+
+class ResultCache(object):
+    '''An on-disk cache of solved mazes, keyed by the hash of the picture.
+
+    Each entry is a compressed .npz file holding the raw maze, the solution
+    and the number of cycles. Reading an entry updates its modification time,
+    and the least recently used entries are removed whenever the cache grows
+    beyond max_size bytes.
+    '''
+
+    # Must be changed whenever the meaning of the cached data changes.
+    VERSION = 1
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, data, solver, page=None):
+        '''Returns the key for the picture contents and solver name, and the
+        page number for PDF files.
+
+        The contents are either bytes or a seekable file object, which is read
+        in chunks and then rewound.
+        '''
+        if isinstance(data, bytes):
+            digest = hashlib.sha256(data)
+        else:
+            start = data.tell()
+            digest = hashlib.sha256()
+            for chunk in iter(functools.partial(data.read, 1 << 20), b''):
+                digest.update(chunk)
+            data.seek(start)
+        digest.update('\0{0}\0{1}'.format(self.VERSION, solver).encode('utf8'))
+        if page is not None:
+            digest.update('\0{0}'.format(page).encode('utf8'))
+        return digest.hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        '''Returns a tuple of (raw maze, solution, number of cycles), or None
+        if the key is not in the cache.'''
+        filename = self.filename(key)
+        try:
+            f = open(filename, 'rb')
+        except (IOError, OSError):
+            return None
+        try:
+            with f:
+                entry = numpy.load(f)
+                result = (MazeGrid(entry['raw']), MazeGrid(entry['solution']),
+                          int(entry['cycles']))
+            os.utime(filename, None)
+        except (IOError, OSError, KeyError, ValueError, EOFError, BadZipFile,
+                zlib.error):
+            # A corrupt or truncated entry. Removing it, so it is written
+            # again.
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            return None
+        return result
+
+    def put(self, key, raw, solution, num_cycles):
+        '''Stores an entry, then removes old entries if needed.'''
+        filename = self.filename(key)
+        # Writing to a temporary file first, so other processes never see a
+        # partially written entry.
+        temporary = '{0}.{1}.tmp'.format(filename, os.getpid())
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            with open(temporary, 'wb') as f:
+                numpy.savez_compressed(
+                    f, raw=raw.cells, solution=solution.cells,
+                    cycles=num_cycles)
+            os.rename(temporary, filename)
+        except (IOError, OSError):
+            # evict() only sees the .npz files, so nobody else would remove
+            # the temporary file.
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self):
+        '''Removes the least recently used entries until the total size is
+        at most max_size.'''
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+
+class Profiler(object):
+    '''Measures the stages of main(), for --profile.
+
+    Each stage is a "with profiler.stage(name):" block. The time and, if
+    tracemalloc is available, the peak memory allocated during each stage
+    are kept, as well as named counters, and report() prints all of them as
+    a table. If filename is given, cProfile runs from start() to report(),
+    and its statistics are saved to that file.
+
+    A disabled profiler does nothing, so the stages can always be marked.
+    '''
+
+    def __init__(self, enabled=True, filename=None):
+        self.enabled = enabled
+        self.filename = filename
+        self.stages = []
+        self.counters = collections.OrderedDict()
+        self.profile = None
+
+    def start(self):
+        if self.enabled and self.filename:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        # Tracing may have been started by PYTHONTRACEMALLOC, and must then
+        # be left running. Its peak can only be reset on Python 3.9+, and the
+        # memory allocated before the stage is not counted.
+        started = bool(tracemalloc) and not tracemalloc.is_tracing()
+        measured = started or hasattr(tracemalloc, 'reset_peak')
+        base = 0
+        if started:
+            tracemalloc.start()
+        elif measured:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = timeit.default_timer()
+        try:
+            yield
+        finally:
+            elapsed = timeit.default_timer() - start
+            peak = None
+            if measured:
+                peak = tracemalloc.get_traced_memory()[1] - base
+            if started:
+                tracemalloc.stop()
+            self.stages.append((name, elapsed, peak))
+
+    def split(self, name, elapsed):
+        '''Moves elapsed seconds of the last stage into a new stage, for work
+        interleaved with it, such as printing. The peak memory of the new
+        stage is not known.'''
+        if not self.enabled:
+            return
+        last, total, peak = self.stages[-1]
+        self.stages[-1] = (last, total - elapsed, peak)
+        self.stages.append((name, elapsed, None))
+
+    def count(self, name, value):
+        self.counters[name] = value
+
+    def report(self, output=None):
+        if not self.enabled:
+            return
+        if self.profile:
+            self.profile.disable()
+            self.profile.dump_stats(self.filename)
+        output = output or sys.stderr
+
+        rows = [('stage', 'time (ms)', 'peak memory (KiB)')]
+        for name, elapsed, peak in self.stages:
+            rows.append((name, '{0:.1f}'.format(elapsed * 1000),
+                         '-' if peak is None else str(peak // 1024)))
+        rows.append(('total', '{0:.1f}'.format(
+            sum(elapsed for _, elapsed, _ in self.stages) * 1000), ''))
+        widths = [max(len(row[i]) for row in rows) for i in range(3)]
+        for row in rows:
+            print('{0:<{3}}  {1:>{4}}  {2:>{5}}'.format(
+                *(row + tuple(widths))), file=output)
+        for name, value in self.counters.items():
+            print('{0}: {1}'.format(name, value), file=output)
+
+
+def load_pixels(imgfile, save_intermediate=False, profiler=None):
+    '''Reads a maze picture (a file name, file object or PIL image) and
+    returns it preprocessed and cropped, as returned by preprocess_image().'''
+
+    profiler = profiler or Profiler(enabled=False)
+
+    # Binary PGM and PPM files are not decoded, as their pixels can be read
+    # directly from the file.
+    with profiler.stage('decode'):
+        mapped = None
+        if isinstance(imgfile, Image.Image):
+            img = imgfile
+        else:
+            mapped = map_netpbm(imgfile)
+            if mapped is None:
+                img = open_picture(imgfile)
+        if mapped is None:
+            img.load()
+
+    # Preprocessing the image, essentially removing JPG artifacts by
+    # thresholding, and thus reducing the number of colors. This also converts
+    # the image to RGB, which is what this script expects.
+    with profiler.stage('threshold'):
+        if mapped is None:
+            pixels = preprocess_image(img)
+        else:
+            pixels = threshold_pixels(*mapped)
+    profiler.count('pixels', pixels.size)
+    if save_intermediate:
+        pixels_as_image(pixels).save('01-preprocessed.png')
+
+    # Auto-cropping the white border.
+    height, width = pixels.shape
+    with profiler.stage('crop'):
+        top, bottom, left, right = find_white_border(pixels)
+    #print('White border detected: top={0} bottom={1} left={2} '
+    #      'right={3}'.format(top, bottom, left, right))
+    pixels = pixels[top:height - bottom, left:width - right]
+    if save_intermediate:
+        pixels_as_image(pixels).save('02-autocropped.png')
+
+    return pixels
+
+
+def load_maze(imgfile, save_intermediate=False):
+    '''Reads a maze picture (a file name or file object) and returns a
+    MazeGrid.'''
+
+    # Building a maze of cells from the image pixels.
+    return build_maze_grid_from_image(
+        load_pixels(imgfile, save_intermediate))
+
+
+def solve_file(filename, solver, data=None, cache=None, page=None):
+    '''Loads and solves a single maze picture, for the batch and server modes.
+
+    If data is given, it is used as the contents of the file, and filename is
+    only used in the results. If cache is given, it is a ResultCache. For PDF
+    files, page selects the page (counting from 1) whose largest image is
+    solved, and it defaults to the first one.
+
+    Returns a dictionary with the results, or with the error message if the
+    file could not be solved. In that case, error_kind is 'missing' if the
+    file does not exist, 'invalid' if it is not a maze picture that can be
+    read, and 'internal' for any other error.
+    '''
+
+    record = {'file': filename}
+    if page is not None:
+        record['page'] = page
+    try:
+        if data is None:
+            imgfile = open(filename, 'rb')
+        else:
+            imgfile = io.BytesIO(data)
+        with imgfile:
+            key = cache.key(imgfile, solver, page) if cache else None
+            cached = cache.get(key) if cache else None
+            if cached:
+                pass
+            elif page is not None:
+                maze = load_maze(PdfReader(imgfile).page_image(page))
+            else:
+                maze = load_maze(imgfile)
+        if cached:
+            _, maze, num_cycles = cached
+        else:
+            raw_maze = maze.copy()
+            if solver == 'junctions':
+                graph = JunctionGraph.from_grid(maze)
+                num_cycles = graph.count_cycles()
+                find_shortest_path_junctions(maze, graph=graph)
+            elif solver in DEAD_END_SOLVERS:
+                SOLVERS[solver](maze)
+                # See main().
+                num_cycles = count_cycles(maze)
+            else:
+                num_cycles = count_cycles(maze)
+                SOLVERS[solver](maze)
+            if cache:
+                cache.put(key, raw_maze, maze, num_cycles)
+        record.update(
+            width=maze.width,
+            height=maze.height,
+            cycles=num_cycles,
+            solution=Cell.maze_as_unicode(maze),
+        )
+    except Exception as e:
+        record['error'] = '{0}: {1}'.format(type(e).__name__, e)
+        if isinstance(e, (IOError, OSError)) and e.errno == errno.ENOENT:
+            record['error_kind'] = 'missing'
+        elif isinstance(e, (IOError, OSError, ValueError, zlib.error)):
+            # Also raised by PIL and PdfReader for unreadable pictures.
+            record['error_kind'] = 'invalid'
+        else:
+            record['error_kind'] = 'internal'
+    return record
+
+
+def ignore_interrupts():
+    '''Makes Ctrl+C stop only the main process, not the pool workers.'''
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def list_pages(filename, data=None):
+    '''Returns the tasks for solving a file: a list of (filename, page, data)
+    tuples, with one tuple per page for multi-page PDF files, or a single
+    tuple with page None for anything else.'''
+
+    try:
+        if data is None:
+            with open(filename, 'rb') as f:
+                num_pages = len(PdfReader(f).pages) if is_pdf(f) else 1
+        else:
+            f = io.BytesIO(data)
+            num_pages = len(PdfReader(f).pages) if is_pdf(f) else 1
+    except (IOError, OSError) + PdfReader.ERRORS:
+        # The error is reported when solving the file.
+        num_pages = 1
+    if num_pages == 1:
+        return [(filename, None, data)]
+    return [(filename, page, data) for page in range(1, num_pages + 1)]
+
+
+def solve_task(task, solver, cache=None):
+    '''Calls solve_file() for a task returned by list_pages().'''
+    filename, page, data = task
+    return solve_file(filename, solver, data, cache, page)
+
+
+def solve_batch(pattern, solver, jobs=None, cache=None):
+    '''Solves all files in a directory or matching a glob pattern, using a
+    pool of worker processes.
+
+    See solve_tasks().
+    '''
+
+    if os.path.isdir(pattern):
+        filenames = [os.path.join(pattern, name)
+                     for name in sorted(os.listdir(pattern))]
+        filenames = [name for name in filenames if os.path.isfile(name)]
+    else:
+        filenames = sorted(glob.glob(pattern))
+
+    tasks = []
+    for filename in filenames:
+        tasks.extend(list_pages(filename))
+    solve_tasks(tasks, solver, jobs, cache)
+
+
+def solve_tasks(tasks, solver, jobs=None, cache=None):
+    '''Solves the tasks returned by list_pages(), using a pool of worker
+    processes.
+
+    One JSON record (see solve_file()) is printed per line, in the order the
+    files (or pages of PDF files) are solved.
+    '''
+
+    pool = multiprocessing.Pool(jobs, ignore_interrupts)
+    try:
+        for record in pool.imap_unordered(
+                functools.partial(solve_task, solver=solver, cache=cache),
+                tasks):
+            print(json.dumps(record, sort_keys=True))
+            sys.stdout.flush()
+    finally:
+        pool.close()
+        pool.join()
+
+
+def record_as_text(record):
+    '''Formats a record returned by solve_file() like the output of main()
+    with verboseness 0.'''
+
+    if 'error' in record:
+        return u'{0}\n'.format(record['error'])
+    lines = [u'Solution:', record['solution']]
+    if record['cycles']:
+        lines.append(u'This maze contains {0} {1}.'.format(
+            record['cycles'], 'cycle' if record['cycles'] == 1 else 'cycles'))
+    return u'\n'.join(lines) + u'\n'
+
+
+class MazeRequestHandler(BaseHTTPRequestHandler):
+    '''Handles the requests of the server mode (see serve()).'''
+
+    # HTTP status for each error_kind of solve_file().
+    ERROR_STATUSES = {'missing': 404, 'invalid': 400, 'internal': 500}
+
+    def do_GET(self):
+        self.solve(None)
+
+    def do_POST(self):
+        length = (self.headers.get('Content-Length') or '0').strip()
+        if not length.isdigit():
+            return self.reply(400, u'Invalid Content-Length.\n')
+        self.solve(self.rfile.read(int(length)))
+
+    def solve(self, data):
+        url = urlparse(self.path)
+        query = dict((key, values[-1])
+                     for key, values in parse_qs(url.query).items())
+        solver = query.get('solver', self.server.solver)
+        output_format = query.get('format', 'text')
+
+        if url.path != '/solve':
+            return self.reply(404, u'Not found.\n')
+        if solver not in SOLVERS:
+            return self.reply(400, u'Unknown solver.\n')
+        if output_format not in ['text', 'json']:
+            return self.reply(400, u'Unknown format.\n')
+        page = query.get('page')
+        if page is not None:
+            if not page.isdigit() or int(page) < 1:
+                return self.reply(400, u'Invalid page.\n')
+            page = int(page)
+        if data is None:
+            if 'path' not in query:
+                return self.reply(400, u'Missing path.\n')
+            args = (query['path'], solver, None, self.server.cache, page)
+        else:
+            args = (query.get('path', '-'), solver, data, self.server.cache,
+                    page)
+
+        record = self.server.pool.apply(solve_file, args)
+
+        status = self.ERROR_STATUSES.get(record.get('error_kind'), 200)
+        if output_format == 'json':
+            self.reply(status, json.dumps(record, sort_keys=True) + '\n',
+                       'application/json')
+        else:
+            self.reply(status, record_as_text(record))
+
+    def reply(self, status, body, content_type='text/plain'):
+        body = body.encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type + '; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MazeServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def serve(port, solver, jobs=None, cache=None):
+    '''Runs an HTTP server on 127.0.0.1:port, solving mazes until
+    interrupted.
+
+    Each request is handled in its own thread, but the mazes are solved by a
+    pool of worker processes, which limits how many are solved at once.
+    '''
+
+    pool = multiprocessing.Pool(jobs, ignore_interrupts)
+    server = MazeServer(('127.0.0.1', port), MazeRequestHandler)
+    server.pool = pool
+    server.solver = solver
+    server.cache = cache
+    print('Listening on http://127.0.0.1:{0}/solve'.format(
+        server.server_address[1]), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.terminate()
+        pool.join()
+
+
+# Library API. These functions are the steps of main(), for using this module
+# from other Python code:
+#
+#   import maze_solver
+#   pixels = maze_solver.load_image('maze.png')
+#   maze = maze_solver.parse_maze(pixels)
+#   solution = maze_solver.solve(maze, 'wavefront')
+#   print(maze_solver.render(solution))
+#
+# The mazes are MazeGrid objects, and the pixels are numpy arrays as returned
+# by preprocess_image(). draw_solution() and count_cycles() can also be used.
+
+def load_image(source):
+    '''Reads a maze picture and returns it preprocessed and cropped.
+
+    The source can be a file name, a file object, the contents of a file as
+    bytes (Python 3 only), a PIL image, or a numpy array of RGB or grayscale
+    pixels (as accepted by Image.fromarray()).
+    '''
+
+    if isinstance(source, numpy.ndarray):
+        source = Image.fromarray(source)
+    elif isinstance(source, bytes) and bytes is not str:
+        source = io.BytesIO(source)
+    return load_pixels(source)
+
+
+def detect_grid(pixels):
+    '''Returns the coordinates of the walls, as find_walls() does.'''
+
+    return find_walls(pixels)
+
+
+def parse_maze(pixels, walls=None):
+    '''Returns a MazeGrid with the cells read from the pixels.
+
+    If walls is given, it is what detect_grid() returns for these pixels.
+    '''
+
+    return build_maze_grid_from_image(pixels, walls)
+
+
+def solve(maze, solver='queue'):
+    '''Returns a solved copy of the maze, using the named solver (a key of
+    SOLVERS). The maze itself is not changed, so it can be solved again.'''
+
+    if not isinstance(maze, MazeGrid):
+        maze = MazeGrid.from_cells(maze)
+    solution = maze.copy()
+    SOLVERS[solver](solution)
+    return solution
+
+
+def render(maze):
+    '''Returns the maze as a unicode string, one line per row of cells.'''
+
+    return Cell.maze_as_unicode(maze)
+
+
+def main():
+    options = parse_arguments()
+
+    cache = None
+    if options.cache:
+        cache = ResultCache(options.cache_dir, options.cache_size * 1e6)
+
+    if options.batch is not None:
+        solve_batch(options.batch, options.solver, options.jobs, cache)
+        return
+    if options.serve is not None:
+        serve(options.serve, options.solver, options.jobs, cache)
+        return
+
+    # The cache has no pixels, nor the output of the solvers.
+    if (options.save_intermediate or options.output_image or
+            options.verboseness >= 2):
+        cache = None
+
+    profiler = Profiler(options.profile, options.profile_output)
+    profiler.start()
+
+    # Pictures are read straight from the file (and PGM and PPM files are
+    # memory-mapped). Only pipes must be read into memory first.
+    imgfile = options.imgfile
+    with profiler.stage('read'):
+        try:
+            imgfile.tell()
+        except (IOError, OSError):
+            imgfile = io.BytesIO(imgfile.read())
+
+    if is_pdf(imgfile):
+        if isinstance(imgfile, io.BytesIO):
+            tasks = list_pages('-', imgfile.getvalue())
+        else:
+            tasks = list_pages(imgfile.name)
+        if len(tasks) > 1:
+            # The pages are solved by other processes, which only return
+            # their solutions.
+            unsupported = [name for name, used in [
+                ('--save-intermediate', options.save_intermediate),
+                ('--verboseness above 1', options.verboseness >= 2),
+                ('--output-image', options.output_image),
+                ('--wave-format', options.wave_format != 'full'),
+                ('--wave-every', options.wave_every != 1),
+                ('--profile and --profile-output', options.profile),
+            ] if used]
+            if unsupported:
+                print('{0}: error: {1} cannot be used with multi-page PDF '
+                      'files'.format(os.path.basename(sys.argv[0]),
+                                     ', '.join(unsupported)),
+                      file=sys.stderr)
+                sys.exit(2)
+            solve_tasks(tasks, options.solver, options.jobs, cache)
+            return
+    key = cached = None
+    if cache:
+        with profiler.stage('cache lookup'):
+            key = cache.key(imgfile, options.solver)
+            cached = cache.get(key)
+
+    if cached:
+        maze, solved_maze, num_cycles = cached
+        if options.verboseness >= 1:
+            with profiler.stage('print raw'):
+                print('Raw maze:')
+                print_maze(maze)
+    else:
+        pixels = load_pixels(imgfile, options.save_intermediate, profiler)
+        with profiler.stage('walls'):
+            walls = find_walls(pixels)
+        with profiler.stage('cells'):
+            if options.verboseness >= 1:
+                # Printing each row as soon as it is built.
+                print('Raw maze:')
+                rows = []
+                printing = 0
+                for row in iter_maze_rows_from_image(pixels, walls):
+                    start = timeit.default_timer()
+                    print_maze_rows([row])
+                    printing += timeit.default_timer() - start
+                    rows.append(row)
+                maze = MazeGrid(rows)
+            else:
+                maze = build_maze_grid_from_image(pixels, walls)
+        if options.verboseness >= 1:
+            profiler.split('print raw', printing)
+    profiler.count('cells', maze.cells.size)
+
+    # Solving the maze.
+    unsolved_maze = maze.copy()
+    graph = None
+    if cached:
+        maze = solved_maze
+    else:
+        solve = SOLVERS[options.solver]
+        if options.solver in DEAD_END_SOLVERS:
+            solve = functools.partial(solve, wave_printer=WavePrinter(
+                options.wave_format, options.wave_every))
+        with profiler.stage('solve'):
+            if options.solver == 'junctions':
+                # Also used for counting the cycles below.
+                graph = JunctionGraph.from_grid(maze)
+                solve = functools.partial(solve, graph=graph)
+            result = solve(maze, options.verboseness - 1)
+        if options.solver in DEAD_END_SOLVERS:
+            profiler.count('dead-end removal iterations', len(result))
+            profiler.count('dead-ends visited', sum(result))
+        else:
+            profiler.count('solution length', len(result))
+        profiler.count('cells removed', int(numpy.count_nonzero(
+            (unsolved_maze.cells != 0) & (maze.cells == 0))))
+
+    with profiler.stage('print'):
+        if options.verboseness >= 0:
+            print('Solution:')
+            print_maze(maze)
+    if options.output_image:
+        with profiler.stage('output image'):
+            draw_solution(pixels, maze, walls=walls).save(
+                options.output_image)
+
+    # Checking for cycles. Filling a dead-end removes one cell and one
+    # passage (or two cells, if only they were left in their component), so
+    # the number of cycles of the solved maze is the same, and it is faster
+    # to count. Other solvers also remove the cycles, so the unsolved maze
+    # must be used.
+    if not cached:
+        with profiler.stage('cycles'):
+            if graph:
+                num_cycles = graph.count_cycles()
+            elif options.solver in DEAD_END_SOLVERS:
+                num_cycles = count_cycles(maze)
+            else:
+                num_cycles = count_cycles(unsolved_maze)
+        if cache:
+            with profiler.stage('cache store'):
+                cache.put(key, unsolved_maze, maze, num_cycles)
+    if num_cycles:
+        if options.verboseness >= 0:
+            print('This maze contains {0} {1}.'.format(
+                num_cycles, 'cycle' if num_cycles == 1 else 'cycles'))
+    else:
+        if options.verboseness >= 2:
+            print('This maze does not contain cycles.')
+    if options.verboseness >= 3:
+        # After removing the special attribute of the cells and cutting the
+        # dead-ends, only the cycles are left.
+        maze = unsolved_maze
+        maze.cells &= ~SPECIAL & 0xFF
+        fill_dead_ends(maze)
+        print_maze(maze)
+
+    profiler.report()
+
+
+def run():
+    '''Runs main(), as the command-line interface of maze-solver.py.'''
+
+    try:
+        main()
+    except IOError as e:
+        # Such as when the output is piped into head.
+        if e.errno != errno.EPIPE:
+            raise
+        # Avoiding another error when Python flushes stdout at exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+if __name__ == '__main__':
+    run()